@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+'''
+Converts each resources corpus end to end with `read` and with `parse`,
+reporting syllables/sec, lines/sec and the peak RSS of the conversion, and
+checks the outputs against the digests in golden.json. The parse outputs
+of the corpora with a reviewed word list in expected/ are checked word by
+word instead, and those of tib_syllables must agree with tib_syl.uni at
+least as well as they do now. Every corpus runs in a fresh process, with
+its config and a cold parse cache. Exits with 1 if a check fails.
+
+    python benchmarks/corpus.py [--repeat N] [--only CORPUS ...]
+                                [--save FILE] [--update-golden]
+'''
+
+import sys
+import json
+import time
+import hashlib
+import platform
+import argparse
+import resource
+
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from pytib.core import parse, clear_parse_cache
+from pytib.read import read, _partition_word
+from pytib.tables import generate_tables
+from pytib.exceptions import InvalidLanguage
+
+BENCHMARKS = Path(__file__).absolute().parent
+RESOURCES = BENCHMARKS.parent / 'resources'
+CONFIGS = BENCHMARKS.parent / 'configs'
+GOLDEN = BENCHMARKS / 'golden.json'
+EXPECTED = BENCHMARKS / 'expected'
+
+CORPORA = (
+    ('tib_syllables', None),
+    ('tibsyll_wo_upper.txt', None),
+    ('tibsyll_sans.txt', None),
+    ('sanskrit_sample', None),
+    ('refuge.wyl', None),
+    ('cornercases', None),
+    ('spellerrors_schol', None),
+    ('polyglotta/Lalit_tib5.txt', 'polyglotta.json'),
+)
+
+# Unicode list of the tib_syllables corpus. It is not line parallel to it,
+# so the share of the parse outputs found in it is checked against a floor.
+REFERENCE = ('tib_syllables', 'tib_syl.uni')
+MIN_REFERENCE_AGREEMENT = 0.95
+
+
+def load_table(config_name):
+    config = {}
+
+    if config_name:
+        with open(CONFIGS / config_name, encoding='utf-8') as f:
+            config = json.load(f)
+
+    return generate_tables(config)
+
+
+def corpus_syllables(name, table):
+    '''
+    Words of the corpus as `read` parses them, leaving out the shads and
+    the other punctuation
+    '''
+
+    punctuation = set(table.PUNCTUATION_CHARS)
+
+    with open(RESOURCES / name, encoding='utf-8') as f:
+        return [
+            part for word in f.read().split()
+            for part in _partition_word(word, table)
+            if part not in punctuation
+        ]
+
+
+def time_read(name, table):
+    clear_parse_cache()
+    digest = hashlib.sha256()
+    start = time.perf_counter()
+
+    with open(RESOURCES / name, encoding='utf-8') as f:
+        for output in read(f, table):
+            digest.update(output.encode('utf-8'))
+
+    return time.perf_counter() - start, digest.hexdigest()
+
+
+def time_parse(syllables, table):
+    clear_parse_cache()
+    outputs = []
+    start = time.perf_counter()
+
+    for syllable in syllables:
+        try:
+            outputs.append(parse(syllable, table))
+        except InvalidLanguage as e:
+            outputs.append('!' + type(e).__name__)
+
+    elapsed = time.perf_counter() - start
+    digest = hashlib.sha256('\n'.join(outputs).encode('utf-8'))
+
+    return elapsed, digest.hexdigest(), outputs
+
+
+def reference_agreement(outputs):
+    with open(RESOURCES / REFERENCE[1], encoding='utf-8-sig') as f:
+        reference = {line.strip().rstrip('་') for line in f}
+
+    return sum(output in reference for output in outputs) / len(outputs)
+
+
+def expected_outputs(name):
+    '''
+    Reviewed parse output of each word of the corpus, as `word<TAB>output`
+    lines with `!` and the exception name for a rejected word, or None if
+    the corpus has none
+    '''
+
+    path = EXPECTED / f'{name}.tsv'
+
+    if not path.exists():
+        return None
+
+    with open(path, encoding='utf-8') as f:
+        return [tuple(line.rstrip('\n').split('\t')) for line in f]
+
+
+def unexpected_words(syllables, outputs, expected):
+    ''' Words whose output is not the reviewed one, as `word: output` '''
+
+    if len(syllables) != len(expected):
+        return [f'{len(syllables)} words, {len(expected)} expected']
+
+    return [
+        f'{word}: {output} (expected {expected_output})'
+        for word, output, (expected_word, expected_output)
+        in zip(syllables, outputs, expected)
+        if word != expected_word or output != expected_output
+    ]
+
+
+def run_corpus(name, config_name, repeat):
+    ''' Benchmarks one corpus, in a process of its own '''
+
+    table = load_table(config_name)
+    syllables = corpus_syllables(name, table)
+
+    with open(RESOURCES / name, encoding='utf-8') as f:
+        lines = sum(1 for _ in f)
+
+    read_times, read_digests = zip(*(time_read(name, table)
+                                     for _ in range(repeat)))
+    parse_time, parse_digest, outputs = min(time_parse(syllables, table)
+                                            for _ in range(repeat))
+
+    # ru_maxrss is in KiB on Linux, and in bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    rss_bytes = rss if sys.platform == 'darwin' else rss * 1024
+
+    result = {
+        'lines': lines,
+        'syllables': len(syllables),
+        'read_syllables_per_sec': len(syllables) / min(read_times),
+        'read_lines_per_sec': lines / min(read_times),
+        'parse_syllables_per_sec': len(syllables) / parse_time,
+        'peak_rss_bytes': rss_bytes,
+        'read_digest': read_digests[0],
+        'parse_digest': parse_digest,
+    }
+
+    expected = expected_outputs(name)
+
+    if expected is not None:
+        del result['parse_digest']
+        result['unexpected_words'] = unexpected_words(syllables, outputs,
+                                                      expected)
+
+    if name == REFERENCE[0]:
+        result['reference_agreement'] = reference_agreement(outputs)
+
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--only', nargs='+', metavar='CORPUS',
+                        help='Run only the named corpora')
+    parser.add_argument('--save', type=Path, metavar='FILE',
+                        help='Save the results as JSON')
+    parser.add_argument('--update-golden', action='store_true',
+                        help='Store the output digests as the golden ones')
+    args = parser.parse_args()
+
+    with open(GOLDEN, encoding='utf-8') as f:
+        golden = json.load(f)
+
+    results = {}
+    failures = []
+
+    print(f'{"corpus":<28}{"lines":>7}{"syllables":>11}{"read syl/s":>12}'
+          f'{"lines/s":>10}{"parse syl/s":>13}{"peak RSS":>11}  golden')
+
+    for name, config_name in CORPORA:
+        if args.only and name not in args.only:
+            continue
+
+        with ProcessPoolExecutor(1, mp_context=get_context('spawn')) as pool:
+            result = pool.submit(run_corpus, name, config_name,
+                                 args.repeat).result()
+
+        digests = {'read': result['read_digest']}
+
+        if 'parse_digest' in result:
+            digests['parse'] = result['parse_digest']
+
+        if args.update_golden:
+            golden[name] = digests
+
+        matches = (golden.get(name) == digests
+                   and not result.get('unexpected_words')
+                   and result.get('reference_agreement', 1)
+                   >= MIN_REFERENCE_AGREEMENT)
+
+        if not matches:
+            failures.append(name)
+
+        results[name] = result
+        print(f'{name:<28}{result["lines"]:>7}{result["syllables"]:>11}'
+              f'{result["read_syllables_per_sec"]:>12.0f}'
+              f'{result["read_lines_per_sec"]:>10.0f}'
+              f'{result["parse_syllables_per_sec"]:>13.0f}'
+              f'{result["peak_rss_bytes"] / 2**20:>7.1f} MiB'
+              f'  {"ok" if matches else "DIFFERS"}')
+
+        for word in result.get('unexpected_words', ()):
+            print(f'    {word}')
+
+        if 'reference_agreement' in result:
+            print(f'    {result["reference_agreement"]:.1%} of the outputs '
+                  f'are in {REFERENCE[1]} '
+                  f'(at least {MIN_REFERENCE_AGREEMENT:.1%})')
+
+    if args.update_golden:
+        with open(GOLDEN, 'w', encoding='utf-8') as f:
+            json.dump(golden, f, indent=2, sort_keys=True)
+            f.write('\n')
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'results': results,
+            }, f, indent=2)
+
+    if failures:
+        print(f'Output differs from golden.json, expected/ or '
+              f'{REFERENCE[1]}: {", ".join(failures)}')
+        return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
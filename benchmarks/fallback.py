@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+'''
+Compares the exception driven Tibetan -> Sanskrit fallback with the
+exception-free `analyze_word` path, on the Sanskrit sample corpora. The
+exception driven path is the former control flow of `parse`, which raises
+ParseError to fall back. Both paths run the same Tibetan engine, the
+syllable automaton, so that only the fallback differs.
+
+    python benchmarks/fallback.py [--repeat N]
+'''
+
+import sys
+import json
+import time
+import argparse
+
+from pathlib import Path
+
+from pytib.core import (analyze_word, recognize_tibetan, analyze_sanskrit,
+                        sanskrit_quick_check, NO_VOWEL, REJECTED)
+from pytib.read import _partition_word
+from pytib.tables import generate_tables
+from pytib.exceptions import InvalidLanguage, InvalidTibetan, ParseError
+
+RESOURCES = Path(__file__).absolute().parent.parent / 'resources'
+CONFIGS = Path(__file__).absolute().parent.parent / 'configs'
+
+CORPORA = (
+    ('sanskrit_sample', None),
+    ('tibsyll_sans.txt', None),
+    ('polyglotta/Lalit_tib5.txt', 'polyglotta.json'),
+)
+
+
+def raising_tibetan(string, table):
+    ''' `recognize_tibetan`, raising ParseError where it rejects '''
+
+    state, syllable = recognize_tibetan(string, table)
+
+    if state == NO_VOWEL:
+        raise InvalidTibetan(string)
+    if state == REJECTED:
+        raise ParseError
+
+    return syllable
+
+
+def exception_parse(string, table):
+    ''' The control flow of `parse` before the result returning API '''
+
+    if sanskrit_quick_check(string, table):
+        return analyze_sanskrit(string, table)
+
+    try:
+        return raising_tibetan(string, table)
+    except InvalidTibetan:
+        raise
+    except ParseError:
+        return analyze_sanskrit(string, table)
+
+
+def exception_path(words, table):
+    for word in words:
+        try:
+            exception_parse(word, table)
+        except InvalidLanguage:
+            pass
+
+
+def result_path(words, table):
+    for word in words:
+        analyze_word(word, table)
+
+
+def corpus_words(name, table):
+    ''' Words of the corpus as `read` parses them, without punctuation '''
+
+    punctuation = set(table.PUNCTUATION_CHARS)
+
+    with open(RESOURCES / name, encoding='utf-8') as f:
+        return [
+            part for word in f.read().split()
+            for part in _partition_word(word, table)
+            if part not in punctuation
+        ]
+
+
+def best_times(funcs, words, table, repeat):
+    '''
+    Best time of each function over the words. The functions take turns,
+    so that a drift of the machine's speed affects them alike.
+    '''
+
+    timings = [[] for _ in funcs]
+
+    for _ in range(repeat):
+        for func, func_timings in zip(funcs, timings):
+            start = time.perf_counter()
+            func(words, table)
+            func_timings.append(time.perf_counter() - start)
+
+    return [min(func_timings) for func_timings in timings]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    print(f'{"corpus":<28}{"words":>8}{"exceptions":>14}{"results":>12}'
+          f'{"speedup":>10}')
+
+    for name, config_name in CORPORA:
+        config = {}
+
+        if config_name:
+            with open(CONFIGS / config_name, encoding='utf-8') as f:
+                config = json.load(f)
+
+        table = generate_tables(config)
+        words = corpus_words(name, table)
+        exceptions, results = best_times((exception_path, result_path),
+                                         words, table, args.repeat)
+
+        print(f'{name:<28}{len(words):>8}'
+              f'{exceptions / len(words) * 1e6:>11.2f} us'
+              f'{results / len(words) * 1e6:>9.2f} us'
+              f'{exceptions / results:>9.2f}x')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+'''
+Micro-benchmarks of the core hot functions, on inputs drawn from the
+resources corpora. Reports the time per op and the peak memory allocated
+by an op, optionally saving the results as JSON and comparing them to a
+saved baseline.
+
+    python benchmarks/micro.py [--repeat N] [--only NAME ...]
+                               [--save FILE] [--baseline FILE]
+                               [--threshold FRACTION]
+'''
+
+import io
+import sys
+import json
+import time
+import platform
+import argparse
+import tracemalloc
+
+from pathlib import Path
+
+from pytib.core import (analyze_syllable, letter_partition, partition,
+                        find_suffixes, to_unicode, generate_stacks,
+                        generate_sanskrit_unicode)
+from pytib.read import _partition_word
+from pytib.tables import (generate_tables, build_tables, write_snapshot,
+                          read_snapshot)
+from pytib.exceptions import ParseError
+
+RESOURCES = Path(__file__).absolute().parent.parent / 'resources'
+
+TIBETAN_CORPUS = 'tib_syllables'
+SANSKRIT_CORPUS = 'sanskrit_sample'
+TEXT_CORPORA = ('refuge.wyl', 'cornercases', 'spellerrors_schol')
+
+# Number of ops sampled for the peak memory of an op
+MEMORY_SAMPLES = 200
+
+
+def corpus_words(name):
+    with open(RESOURCES / name, encoding='utf-8') as f:
+        return f.read().split()
+
+
+def compiled(tables):
+    ''' tables, with the fields compiled on first use compiled as well '''
+
+    for name in tables:
+        getattr(tables, name)
+
+    return tables
+
+
+def snapshot_inputs():
+    ''' A snapshot of the default tables '''
+
+    f = io.BytesIO()
+    write_snapshot(f, build_tables({}))
+    return [f.getvalue()]
+
+
+def tibetan_inputs(table):
+    '''
+    Letters, first vowel index and syllable of the corpus words that the
+    vowel position cascade analyzes, as the cascade passes them along.
+    '''
+
+    inputs = []
+    vowels = table.TIBETAN_VOWEL_SET
+
+    for word in corpus_words(TIBETAN_CORPUS):
+        letters = partition(word, table.TIBETAN_TRIE)
+
+        if letters is None:
+            continue
+
+        letters = tuple(letters)
+        index = next((i for i, c in enumerate(letters) if c in vowels), None)
+
+        if index is None or index >= len(analyze_syllable):
+            continue
+
+        try:
+            syllable = analyze_syllable[index](letters, table)
+            find_suffixes(syllable, index, letters, table)
+        except ParseError:
+            continue
+
+        inputs.append((word, letters, index, syllable))
+
+    return inputs
+
+
+def sanskrit_inputs(table):
+    ''' Words, letters and stacks of the Sanskrit corpus words '''
+
+    inputs = []
+
+    for word in corpus_words(SANSKRIT_CORPUS):
+        for part in _partition_word(word, table):
+            letters = partition(part, table.INDIC_TRIE)
+
+            if letters is None:
+                continue
+
+            stacks = list(generate_stacks(letters, table))
+
+            try:
+                ''.join(generate_sanskrit_unicode(part, stacks, table))
+            except KeyError:
+                continue
+
+            inputs.append((part, letters, stacks))
+
+    return inputs
+
+
+def benchmarks(table):
+    '''
+    Yields the name, op and inputs of each benchmark. The op is called with
+    each of the inputs in turn.
+    '''
+
+    tibetan = tibetan_inputs(table)
+    sanskrit = sanskrit_inputs(table)
+    text_words = [word for name in TEXT_CORPORA for word in corpus_words(name)]
+
+    yield ('letter_partition',
+           lambda word: list(letter_partition(word, table.TIBETAN_TRIE)),
+           [word for word, *_ in tibetan])
+
+    for index, analyze in enumerate(analyze_syllable):
+        yield (analyze.__name__,
+               lambda letters, analyze=analyze: analyze(letters, table),
+               [letters for _, letters, i, _ in tibetan if i == index])
+
+    yield ('find_suffixes',
+           lambda args: find_suffixes(args[2], args[1], args[0], table),
+           [(letters, i, dict(syllable))
+            for _, letters, i, syllable in tibetan])
+
+    yield ('to_unicode',
+           lambda syllable: ''.join(to_unicode(syllable, table)),
+           [syllable for *_, syllable in tibetan])
+
+    yield ('generate_stacks',
+           lambda letters: list(generate_stacks(letters, table)),
+           [letters for _, letters, _ in sanskrit])
+
+    yield ('generate_sanskrit_unicode',
+           lambda args: ''.join(generate_sanskrit_unicode(*args, table)),
+           [(word, stacks) for word, _, stacks in sanskrit])
+
+    yield ('_partition_word',
+           lambda word: list(_partition_word(word, table)),
+           text_words)
+
+    yield ('generate_tables',
+           lambda config: generate_tables(config),
+           [{}] * 1000)
+
+    yield ('build_tables',
+           lambda config: build_tables(config),
+           [{}] * 5)
+
+    # Tables ready for any word, built or loaded from a snapshot
+    yield ('build_tables_compiled',
+           lambda config: compiled(build_tables(config)),
+           [{}] * 5)
+
+    yield ('read_snapshot',
+           lambda data: compiled(read_snapshot(data)),
+           snapshot_inputs() * 5)
+
+
+def time_per_op(op, inputs, repeat):
+    ''' Best time per op in nanoseconds, over `repeat` runs of the inputs '''
+
+    timings = []
+
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+
+        for args in inputs:
+            op(args)
+
+        timings.append(time.perf_counter_ns() - start)
+
+    return min(timings) / len(inputs)
+
+
+def peak_bytes_per_op(op, inputs):
+    '''
+    Mean peak of memory allocated during an op. CPython counts no
+    allocations, so this stands in for the allocations per op.
+    '''
+
+    samples = inputs[:MEMORY_SAMPLES]
+    total = 0
+    tracemalloc.start()
+
+    try:
+        for args in samples:
+            tracemalloc.reset_peak()
+            current, _ = tracemalloc.get_traced_memory()
+            op(args)
+            total += tracemalloc.get_traced_memory()[1] - current
+    finally:
+        tracemalloc.stop()
+
+    return total / len(samples)
+
+
+def compare(results, baseline, threshold):
+    ''' Prints the change against baseline, returns the regressed names '''
+
+    regressions = []
+
+    print(f'\n{"benchmark":<28}{"baseline":>12}{"now":>12}{"change":>10}')
+
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+
+        before = baseline[name]['ns_per_op']
+        change = result['ns_per_op'] / before - 1
+        flag = ''
+
+        if change > threshold:
+            regressions.append(name)
+            flag = '  REGRESSION'
+
+        print(f'{name:<28}{before:>9.0f} ns{result["ns_per_op"]:>9.0f} ns'
+              f'{change:>+9.1%}{flag}')
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--only', nargs='+', metavar='NAME',
+                        help='Run only the named benchmarks')
+    parser.add_argument('--save', type=Path, metavar='FILE',
+                        help='Save the results as JSON')
+    parser.add_argument('--baseline', type=Path, metavar='FILE',
+                        help='Compare with results saved by --save')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='Slowdown reported as regression (default 0.1)')
+    args = parser.parse_args()
+
+    table = generate_tables()
+    results = {}
+
+    print(f'{"benchmark":<28}{"inputs":>8}{"time/op":>12}{"peak/op":>12}')
+
+    for name, op, inputs in benchmarks(table):
+        if args.only and name not in args.only:
+            continue
+
+        results[name] = {
+            'inputs': len(inputs),
+            'ns_per_op': time_per_op(op, inputs, args.repeat),
+            'peak_bytes_per_op': peak_bytes_per_op(op, inputs),
+        }
+        print(f'{name:<28}{len(inputs):>8}'
+              f'{results[name]["ns_per_op"]:>9.0f} ns'
+              f'{results[name]["peak_bytes_per_op"]:>10.0f} B')
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'results': results,
+            }, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+
+        if compare(results, baseline, args.threshold):
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
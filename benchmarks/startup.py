@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+'''
+Startup time of `import pytib` and of a one word `ptib` run, each in fresh
+processes, next to a bare interpreter. Reports the best and median wall time,
+optionally saving the results as JSON and comparing them to a saved baseline,
+or to the same runs on the tree of another git revision, e.g. the first one:
+
+    python benchmarks/startup.py [--repeat N] [--save FILE]
+                                 [--baseline FILE] [--threshold FRACTION]
+                                 [--against REV]
+    python benchmarks/startup.py --against $(git rev-list --max-parents=0 HEAD)
+'''
+
+import io
+import os
+import sys
+import json
+import time
+import tarfile
+import tempfile
+import platform
+import argparse
+import statistics
+import subprocess
+
+from pathlib import Path
+
+ROOT = Path(__file__).absolute().parent.parent
+
+COMMANDS = (
+    ('python', [sys.executable, '-c', 'pass']),
+    ('import pytib', [sys.executable, '-c', 'import pytib']),
+    ('ptib skyo', [sys.executable, '-m', 'pytib.cli', 'skyo']),
+)
+
+
+def tree_env(src):
+    ''' Environment that runs the pytib of the directory src '''
+
+    return {
+        **os.environ,
+        'PYTHONPATH': str(src),
+        # The CLI is run without routing to a daemon, which would skip the
+        # tables. Unlike --no-daemon, this also works on trees without one.
+        'PYTIB_SOCKET': os.path.join(tempfile.gettempdir(), 'pytib-none'),
+    }
+
+
+def extract_tree(rev, directory):
+    ''' Extracts src of the git revision rev into directory '''
+
+    archive = subprocess.run(['git', 'archive', rev, 'src'], cwd=ROOT,
+                             check=True, capture_output=True).stdout
+
+    with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+        tar.extractall(directory)
+
+    return Path(directory) / 'src'
+
+
+def wall_times(command, repeat, env):
+    ''' Wall time in milliseconds of each of `repeat` runs of command '''
+
+    times = []
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL,
+                       env=env)
+        times.append((time.perf_counter() - start) * 1000)
+
+    return times
+
+
+def measure(env, repeat):
+    ''' Best and median wall time of each command, printed as they run '''
+
+    results = {}
+
+    print(f'{"command":<16}{"best":>12}{"median":>12}')
+
+    for name, command in COMMANDS:
+        # A first run warms the file system cache and writes the .pyc files
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL,
+                       env=env)
+        times = wall_times(command, repeat, env)
+        results[name] = {
+            'best_ms': min(times),
+            'median_ms': statistics.median(times),
+        }
+        print(f'{name:<16}{results[name]["best_ms"]:>9.1f} ms'
+              f'{results[name]["median_ms"]:>9.1f} ms')
+
+    return results
+
+
+def compare(results, baseline, threshold):
+    ''' Prints the change against baseline, returns the regressed names '''
+
+    regressions = []
+
+    print(f'\n{"command":<16}{"baseline":>12}{"now":>12}{"change":>10}')
+
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+
+        before = baseline[name]['best_ms']
+        change = result['best_ms'] / before - 1
+        flag = ''
+
+        if change > threshold:
+            regressions.append(name)
+            flag = '  REGRESSION'
+
+        print(f'{name:<16}{before:>9.1f} ms{result["best_ms"]:>9.1f} ms'
+              f'{change:>+9.1%}{flag}')
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--save', type=Path, metavar='FILE',
+                        help='Save the results as JSON')
+    parser.add_argument('--baseline', type=Path, metavar='FILE',
+                        help='Compare with results saved by --save')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='Slowdown reported as regression (default 0.2)')
+    parser.add_argument('--against', metavar='REV',
+                        help='Compare with the same runs on a git revision')
+    args = parser.parse_args()
+
+    results = measure(tree_env(ROOT / 'src'), args.repeat)
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'results': results,
+            }, f, indent=2)
+
+    baselines = []
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baselines.append(json.load(f)['results'])
+
+    if args.against:
+        with tempfile.TemporaryDirectory() as directory:
+            print(f'\n{args.against}:')
+            src = extract_tree(args.against, directory)
+            baselines.append(measure(tree_env(src), args.repeat))
+
+    regressions = [compare(results, baseline, args.threshold)
+                   for baseline in baselines]
+
+    return 1 if any(regressions) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
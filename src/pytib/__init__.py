@@ -1,6 +1,49 @@
-from pytib import tables
-from pytib.read import read
-from pytib.core import parse
-# import pytib.exceptions
+import sys
+import types
+import importlib
 
-__all__ = ['tables', 'parse', 'read']
+from pytib.version import __version__
+
+__all__ = ['tables', 'parse', 'parse_many', 'read', 'read_into', 'translate']
+
+# The package exports, and submodules, are imported on first use, so that
+# e.g. the CLI does not pay for the converter before it is needed
+_EXPORTS = {
+    'parse': 'pytib.core',
+    'parse_many': 'pytib.core',
+    'translate': 'pytib.core',
+    'read': 'pytib.read',
+    'read_into': 'pytib.read',
+}
+
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        value = getattr(importlib.import_module(_EXPORTS[name]), name)
+        globals()[name] = value
+        return value
+
+    try:
+        return importlib.import_module(f'{__name__}.{name}')
+    except ModuleNotFoundError as e:
+        if e.name != f'{__name__}.{name}':
+            raise
+
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
+
+
+class _Package(types.ModuleType):
+    def __setattr__(self, name, value):
+        # Importing the submodule pytib.read binds it on the package, where
+        # the function read of the same name belongs
+        if name in _EXPORTS and isinstance(value, types.ModuleType):
+            return
+
+        super().__setattr__(name, value)
+
+
+sys.modules[__name__].__class__ = _Package
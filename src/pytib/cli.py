@@ -2,40 +2,225 @@ import click
 import logging
 import os
 import sys
-import webbrowser
-import json
-
-from pathlib import Path
+import stat
 
+# The converter, and what only some options use, is imported as needed (see
+# pytib.__getattr__), so that runs routed to a daemon start fast
 import pytib
+import pytib.core
+import pytib.client
+from pytib.disk_cache import DISK_CACHE_SIZE
 from pytib.exceptions import InvalidConfig
 
+# Input files up to this size are sent to a running daemon
+ROUTE_MAX_BYTES = 1 << 20
 
-log_level = logging.DEBUG if os.getenv('DEBUG') in ('1', 'on') else logging.INFO
 logger = logging.getLogger('pytib')
-logger.setLevel(log_level)
-stream_handler = logging.StreamHandler()
-formatter = logging.Formatter('%(name)s - %(levelname)s - %(message)s')
-stream_handler.setFormatter(formatter)
-logger.addHandler(stream_handler)
 
 
-@click.command()
+def configure_logging():
+    ''' Logs pytib messages to stderr, debug messages too if $DEBUG is on '''
+
+    if logger.handlers:
+        return
+
+    debug = os.getenv('DEBUG') in ('1', 'on')
+    logger.setLevel(logging.DEBUG if debug else logging.INFO)
+    stream_handler = logging.StreamHandler()
+    formatter = logging.Formatter('%(name)s - %(levelname)s - %(message)s')
+    stream_handler.setFormatter(formatter)
+    logger.addHandler(stream_handler)
+
+
+class DefaultGroup(click.Group):
+    '''
+    Group that runs its default command unless the first argument names
+    another, so that `ptib WYLIE` keeps converting
+    '''
+
+    def __init__(self, *args, default=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.default = default
+
+    def parse_args(self, ctx, args):
+        if not args or args[0] not in self.commands:
+            args = [self.default, *args]
+
+        return super().parse_args(ctx, args)
+
+
+@click.group(cls=DefaultGroup, default='convert')
+def ptib():
+    """
+    Converts Wylie to Tibetan Unicode, see ptib convert --help.
+    """
+
+
+@ptib.command('convert')
 @click.option('--input-file', '-i', help='Specify file to read',
               type=click.File('r'), nargs=1, default='-')
-@click.option('--config', '-c', help='Config JSON file path',
-              type=click.File('r'), nargs=1, envvar='PYTIB_CONFIG')
+@click.option('--output-file', '-o', help='Specify file to write',
+              type=click.File('wb'), nargs=1, default='-')
+@click.option('--config', '-c', help='Config JSON or table snapshot file path',
+              type=click.File('rb'), nargs=1, envvar='PYTIB_CONFIG')
 @click.option('--preserve-input', '-p', is_flag=True,
               help='Preserve wylie in Unicode output')
 @click.option('--unicode-points', '-u', is_flag=True,
-              help='Print Unicode values')
+              help='Print a row per word with its Unicode values')
+@click.option('--format', 'row_format', type=click.Choice(['tsv', 'jsonl']),
+              default='tsv', show_default=True,
+              help='Row format of --unicode-points')
 @click.option('--html', help='Output as basic HTML document', is_flag=True)
+@click.option('--syllables', '-s', help='Syllable table file to look up',
+              type=click.Path(exists=True, dir_okay=False))
+@click.option('--build-syllables', help='Write the syllable table and exit',
+              type=click.File('w', encoding='utf-8'))
+@click.option('--jobs', '-j', help='Worker processes (0 for all CPUs)',
+              type=click.IntRange(min=0), default=1)
+@click.option('--cache-size', help='Words kept in the parse cache',
+              type=click.IntRange(min=0), envvar='PYTIB_CACHE_SIZE',
+              default=pytib.core.PARSE_CACHE_SIZE, show_default=True)
+@click.option('--disk-cache', help='SQLite file caching conversions',
+              type=click.Path(dir_okay=False), envvar='PYTIB_DISK_CACHE')
+@click.option('--disk-cache-size', help='Words kept in the disk cache',
+              type=click.IntRange(min=1), default=DISK_CACHE_SIZE,
+              show_default=True)
+@click.option('--stats', 'show_stats', is_flag=True,
+              help='Print instrumentation counts to stderr')
+@click.option('--jsonl', is_flag=True,
+              help='Answer JSON requests read line by line')
+@click.option('--serve', is_flag=True, help='Run the conversion daemon')
+@click.option('--socket', 'address', envvar='PYTIB_SOCKET',
+              help='Daemon socket path, or [HOST]:PORT on loopback')
+@click.option('--no-daemon', is_flag=True,
+              help='Convert here even if a daemon is running')
 @click.argument('wylie', required=False)
-def ptib(input_file, wylie, preserve_input, unicode_points, html, config):
+def convert_command(input_file, output_file, wylie, preserve_input,
+                    unicode_points, row_format, html, config, syllables,
+                    build_syllables, jobs, cache_size, disk_cache,
+                    disk_cache_size, show_stats, jsonl, serve, address,
+                    no_daemon):
     """
     WYLIE can be either a string literal or a file.
     The file can be read from STDIN, or from a filepath using the -i parameter.
+    The default command of ptib, `ptib WYLIE` runs `ptib convert WYLIE`. See
+    also `ptib compile-config --help`.
+    """
+
+    configure_logging()
+
+    routable = not (jsonl or serve or no_daemon or build_syllables
+                    or show_stats or unicode_points or preserve_input or html
+                    or jobs != 1)
+
+    # Input is sent whole, so pipes, which may not end, and large files,
+    # which convert as fast here, are streamed here instead
+    if (routable and can_send_config(config)
+            and (wylie is not None or is_small_file(input_file))):
+        client = pytib.client.connect(address)
+
+        if client:
+            with client:
+                # Converted here if the daemon does not, as it is read
+                wylie = wylie or input_file.read()
+
+                if convert_remote(client, wylie, config, output_file):
+                    output_file.close()
+                    input_file.close()
+
+                    if config:
+                        config.close()
+                    return
+
+    tables = load_tables(config, True if build_syllables else syllables)
+
+    if build_syllables:
+        pytib.tables.write_syllables(build_syllables, tables)
+        build_syllables.close()
+        return
+
+    if cache_size != pytib.core.PARSE_CACHE_SIZE:
+        pytib.core.configure_parse_cache(cache_size)
+
+    if disk_cache:
+        disk_cache = pytib.disk_cache.DiskCache(disk_cache, disk_cache_size)
+        pytib.core.use_disk_cache(disk_cache)
+
+    if show_stats:
+        pytib.stats.enable()
+
+    try:
+        if jsonl:
+            service = pytib.service.Service(tables)
+            pytib.service.handle_lines(service, input_file, output_file)
+            input_file.close()
+        elif serve:
+            serve_daemon(pytib.service.Service(tables), address)
+        else:
+            convert(input_file, output_file, wylie, preserve_input,
+                    unicode_points, row_format, html, tables, jobs)
+    finally:
+        output_file.close()
+
+        if disk_cache:
+            pytib.core.use_disk_cache(None)
+            disk_cache.close()
+
+    if show_stats:
+        click.echo(pytib.stats.report(pytib.stats.disable()), err=True)
+
+
+@ptib.command('compile-config')
+@click.argument('config', type=click.File('rb'))
+@click.option('--output-file', '-o', help='Snapshot file to write',
+              type=click.File('wb'), required=True)
+@click.option('--syllables', '-s', help='Syllable table file to include',
+              type=click.Path(exists=True, dir_okay=False))
+@click.option('--build-syllables', is_flag=True,
+              help='Include the lookup of every common syllable')
+def compile_config(config, output_file, syllables, build_syllables):
     """
+    Compiles the tables of the JSON config file CONFIG into a snapshot,
+    which -c and PYTIB_CONFIG load without compiling anything.
+    """
+
+    configure_logging()
+    tables = load_tables(config, True if build_syllables else syllables)
+
+    try:
+        pytib.tables.write_snapshot(output_file, tables)
+    finally:
+        output_file.close()
+
+
+def load_tables(config, syllables):
+    ''' Tables of the open config file, or the default tables '''
+
+    if not config:
+        return pytib.tables.generate_tables(syllables=syllables)
+
+    try:
+        return pytib.service.load_tables(config, syllables)
+    finally:
+        config.close()
+
+
+def convert(input_file, output_file, wylie, preserve_input, unicode_points,
+            row_format, html, tables, jobs):
+    '''
+    Writes the conversion of the input to the binary output file, or to a
+    web page
+    '''
+
+    if unicode_points:
+        write_word_rows(wylie or input_file, output_file, tables, row_format)
+        input_file.close()
+        return
+
+    if not (preserve_input or html):
+        stream_output(wylie or input_file, output_file, tables, jobs)
+        input_file.close()
+        return
 
     if wylie:
         content = wylie
@@ -43,32 +228,17 @@ def ptib(input_file, wylie, preserve_input, unicode_points, html, config):
         content = input_file.read()
         input_file.close()
 
-    if config:
-        try:
-            cfg = json.load(config)
-        except ValueError:
-            raise InvalidConfig('Invalid JSON config file!', 'JSON decoding')
-        finally:
-            config.close()
-    else:
-        cfg = {}
-
-    tables = pytib.tables.generate_tables(cfg)
-
-    if unicode_points:
-        content = content.split('\n')
-        result = tuple(
-            f'U+{ord(char):04X}'
-            for line in content for word in line.split()
-            for char in pytib.parse(word, tables)
-        )
-    else:
-        result = ''.join(pytib.read(content, tables)).rstrip()
+    from pytib.read import read_parallel
+    output = read_parallel(content, tables, jobs or None)
+    result = ''.join(output).rstrip()
 
     if preserve_input:
-        print(content)
+        output_file.write(f'{content}\n'.encode('utf-8'))
 
     if html:
+        import webbrowser
+        from pathlib import Path
+
         cwd = Path(__file__).absolute().parent
         web_dir = cwd / '.web_tmp/'
         web_dir.mkdir(exist_ok=True)
@@ -79,7 +249,119 @@ def ptib(input_file, wylie, preserve_input, unicode_points, html, config):
 
         webbrowser.open_new_tab(index_html.as_uri())
     else:
-        print(result)
+        output_file.write(f'{result}\n'.encode('utf-8'))
+
+
+def serve_daemon(service, address):
+    ''' Runs the conversion daemon on address until it is interrupted '''
+
+    # The event loop is only imported to serve
+    from pytib import server
+
+    try:
+        server.serve(service, address)
+    except (OSError, ValueError) as e:
+        raise click.ClickException(str(e))
+
+
+def convert_remote(client, content, config, output_file):
+    '''
+    Writes the conversion of content by a running daemon to the binary output
+    file, returns False if the daemon did not convert it
+    '''
+
+    # Without a config, the daemon has to convert with the default tables,
+    # not with the ones it was started with
+    if config:
+        path, fingerprint = os.path.abspath(config.name), None
+    else:
+        path, fingerprint = None, pytib.tables.DEFAULT_FINGERPRINT
+
+    try:
+        result = client.convert(content, path, fingerprint)
+    except OSError:
+        result = None
+
+    if result is None:
+        logger.debug('The daemon did not convert the input')
+        return False
+
+    output_file.write(result.encode('utf-8') or b'\n')
+    return True
+
+
+def can_send_config(config):
+    '''
+    True unless the open config file can not be named in a request: if it is
+    read from STDIN, which leaves no path to send, or if it is a snapshot,
+    which the daemon does not load
+    '''
+
+    if not config:
+        return True
+    if config.name == '<stdin>':
+        return False
+
+    return not pytib.tables.is_snapshot(config.peek(64))
+
+
+def is_small_file(file):
+    ''' True if file is a regular file of at most ROUTE_MAX_BYTES '''
+
+    try:
+        status = os.fstat(file.fileno())
+    except (OSError, ValueError):
+        return False
+
+    return stat.S_ISREG(status.st_mode) and status.st_size <= ROUTE_MAX_BYTES
+
+
+def write_word_rows(content, output_file, tables, row_format):
+    '''
+    Writes a row per word of content to the binary output file as it is
+    read: the word, its Unicode, its code points and the path it took, as
+    TSV after a header line, or as JSON lines. The Unicode of a word that
+    could not be parsed is empty, or null in JSON.
+    '''
+
+    from pytib.read import read_words, write_buffered
+
+    words = read_words(content, tables)
+
+    if row_format == 'jsonl':
+        import json
+
+        rows = (
+            json.dumps({'word': word, 'output': unicode,
+                        'codepoints': code_points(unicode), 'path': path},
+                       ensure_ascii=False) + '\n'
+            for word, path, unicode in words
+        )
+    else:
+        output_file.write(b'word\toutput\tcodepoints\tpath\n')
+        rows = (
+            f'{word}\t{unicode or ""}\t{" ".join(code_points(unicode))}'
+            f'\t{path}\n'
+            for word, path, unicode in words
+        )
+
+    write_buffered(rows, output_file)
+
+
+def code_points(unicode):
+    ''' U+XXXX values of the characters of unicode, which may be None '''
+
+    return [f'U+{ord(char):04X}' for char in unicode or '']
+
+
+def stream_output(content, output_file, tables, jobs=1):
+    '''
+    Writes the Unicode of content to the binary output file as it is
+    converted
+    '''
+
+    if not pytib.read_into(content, output_file, tables, jobs or None):
+        output_file.write(b'\n')
 
 
 def to_web(result):
@@ -0,0 +1,156 @@
+'''
+Client of the conversion daemon of `ptib --serve` (see `pytib.server`)
+'''
+
+import os
+import json
+import logging
+
+logger = logging.getLogger('pytib')
+
+# Seconds to wait to connect to the daemon
+CONNECT_TIMEOUT = 1.0
+
+
+def default_address():
+    ''' Address of the daemon, $PYTIB_SOCKET or a socket of the user '''
+
+    address = os.getenv('PYTIB_SOCKET')
+
+    if address:
+        return address
+
+    # Not tempfile.gettempdir(), which probes for a writable directory
+    directory = os.getenv('XDG_RUNTIME_DIR') or os.getenv('TMPDIR') or '/tmp'
+    return os.path.join(directory, f'pytib-{os.getuid()}.sock')
+
+
+def parse_address(address):
+    '''
+    (host, port) of a [HOST]:PORT address, or else a socket path. Raises
+    ValueError if HOST is not a loopback address, as the daemon reads the
+    config files that its requests name.
+    '''
+
+    host, colon, port = address.rpartition(':')
+
+    if colon and port.isdigit() and os.sep not in address:
+        host = host.strip('[]') or '127.0.0.1'
+
+        if not is_loopback(host):
+            raise ValueError(f'Not a loopback address: {host}')
+
+        return host, int(port)
+
+    return address
+
+
+def is_loopback(host):
+    ''' Whether host is localhost or a loopback IP address '''
+
+    if host == 'localhost':
+        return True
+
+    # Imported for TCP addresses only, which are rarely used
+    import ipaddress
+
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+class Client:
+    ''' Blocking connection to a running daemon '''
+
+    def __init__(self, sock):
+        self.socket = sock
+        self.file = sock.makefile('rwb')
+        self.ids = 0
+
+    def request(self, request):
+        ''' Response of the daemon to a request dict '''
+
+        line = json.dumps(request, ensure_ascii=False).encode('utf-8')
+        self.file.write(line + b'\n')
+        self.file.flush()
+
+        line = self.file.readline()
+
+        if not line:
+            raise ConnectionError('The daemon closed the connection')
+
+        return json.loads(line)
+
+    def convert(self, text, config=None, fingerprint=None):
+        '''
+        Unicode of text, converted with the config file at the path config,
+        or with the tables of fingerprint (see `pytib.service`). None if the
+        daemon answers with an error.
+        '''
+
+        self.ids += 1
+        request = {'id': self.ids, 'text': text}
+
+        if config:
+            request['config'] = config
+        if fingerprint:
+            request['fingerprint'] = fingerprint
+
+        return self.request(request).get('result')
+
+    def close(self):
+        self.file.close()
+        self.socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def connect(address=None):
+    '''
+    Client of the daemon at address, None if no daemon answers there, or if
+    its socket belongs to another user
+    '''
+
+    try:
+        address = parse_address(address or default_address())
+    except ValueError as e:
+        logger.warning('Not connecting: %s', e)
+        return None
+
+    if not isinstance(address, tuple):
+        try:
+            owner = os.stat(address).st_uid
+        except OSError:
+            return None
+
+        # A socket another user made, e.g. at the default path in /tmp, could
+        # read or change every conversion sent to it
+        if owner != os.getuid():
+            logger.warning('Not connecting to %s, owned by another user',
+                           address)
+            return None
+
+    # Imported once there may be a daemon, as most runs find none
+    import socket
+
+    try:
+        if isinstance(address, tuple):
+            sock = socket.create_connection(address, CONNECT_TIMEOUT)
+        else:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.settimeout(CONNECT_TIMEOUT)
+                sock.connect(address)
+            except OSError:
+                sock.close()
+                raise
+    except OSError:
+        return None
+
+    sock.settimeout(None)
+    return Client(sock)
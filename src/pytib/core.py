@@ -1,25 +1,28 @@
+import time
 import logging
 import itertools
+import threading
 
-from pytib.tables import SUBOFFSET, U_SNA_LDAN, POSTVOWEL, generate_tables
+from functools import lru_cache
+from collections import Counter, namedtuple
+
+from pytib.tables import (SUBOFFSET, U_SNA_LDAN, POSTVOWEL, PREFIX_SANSKRIT,
+                          PREFIX_DOUBLE, PREFIX_GA, CHAR_VOWEL, CHAR_DIPHTHONG,
+                          CHAR_A_CHUNG, CHAR_NON_TIBETAN, generate_tables,
+                          syllable_candidates)
 from pytib.exceptions import InvalidTibetan, InvalidSanskrit, ParseError
+from pytib import stats
 
 
 logger = logging.getLogger('pytib.core')
 
 
 def valid_superscribe(head_letter, root_letter, table):
-    return (
-        head_letter in table['SUPERJOIN']
-        and root_letter in table['VALID_SUPERJOIN'][head_letter]
-    )
+    return (head_letter, root_letter) in table.SUPERJOIN_PAIRS
 
 
 def valid_subscribe(root_letter, subjoined_letter, table):
-    return (
-        subjoined_letter in table['SUB'] and
-        root_letter in table['VALID_SUBJOINED_LIST'][subjoined_letter]
-    )
+    return (root_letter, subjoined_letter) in table.SUBJOIN_PAIRS
 
 
 def is_superscribed(latin_letters, vowel_position, table):
@@ -30,7 +33,7 @@ def is_superscribed(latin_letters, vowel_position, table):
         )
     else:   # vowel_position == 3
         return (
-            latin_letters[0] in table['PREFIXES']
+            latin_letters[0] in table.PREFIX_SET
             and valid_superscribe(latin_letters[1], latin_letters[2], table)
             and not valid_subscribe(latin_letters[1], latin_letters[2], table)
         )
@@ -44,22 +47,22 @@ def is_subscribed(latin_letters, vowel_position, table):
         )
     else:   # vowel_position == 3
         return (
-            latin_letters[0] in table['PREFIXES']
+            latin_letters[0] in table.PREFIX_SET
             and not valid_superscribe(latin_letters[1], latin_letters[2], table)
             and valid_subscribe(latin_letters[1], latin_letters[2], table)
         )
 
 
 def vowel_pos_0(latin_letters, table):
-    if not latin_letters[0] in table['TIBETAN_VOWELS']:
+    if not latin_letters[0] in table.TIBETAN_VOWEL_SET:
         raise ParseError
 
     return dict(root=latin_letters[0])
 
 
 def vowel_pos_1(latin_letters, table):
-    if (not latin_letters[0] in table['CONSONANTS']
-       and latin_letters[1] in table['TIBETAN_VOWELS']):
+    if (not latin_letters[0] in table.CONSONANT_SET
+       and latin_letters[1] in table.TIBETAN_VOWEL_SET):
         raise ParseError
 
     return dict(root=latin_letters[0], vowel=latin_letters[1])
@@ -71,9 +74,9 @@ def vowel_pos_2(latin_letters, table):
     elif is_superscribed(latin_letters, 2, table):
         result = dict(super=latin_letters[0], root=latin_letters[1])
     # TODO: investigate logical bug!
-    elif (latin_letters[0] == table['GA_PREFIX']
-          or latin_letters[0] in table['PREFIXES']
-          and latin_letters[1] in table['CONSONANTS']):
+    elif (latin_letters[0] == table.GA_PREFIX
+          or latin_letters[0] in table.PREFIX_SET
+          and latin_letters[1] in table.CONSONANT_SET):
         result = dict(prefix=latin_letters[0], root=latin_letters[1])
     else:
         raise ParseError
@@ -84,8 +87,8 @@ def vowel_pos_2(latin_letters, table):
 
 
 def vowel_pos_3(latin_letters, table):
-    if latin_letters[2] == table['CONSONANTS'][19]\
-       and latin_letters[1] == table['CONSONANTS'][24]:
+    if latin_letters[2] == table.CONSONANTS[19]\
+       and latin_letters[1] == table.CONSONANTS[24]:
         # syllable has both 'w' and 'r' as subscribed letters
         result = dict(root=latin_letters[0],
                       subjoined=latin_letters[1],
@@ -98,9 +101,9 @@ def vowel_pos_3(latin_letters, table):
         result = dict(prefix=latin_letters[0],
                       root=latin_letters[1],
                       subjoined=latin_letters[2])
-    elif (latin_letters[0] in table['SUPERJOIN']
-          and latin_letters[1] in table['CONSONANTS']
-          and latin_letters[2] in table['SUB']):
+    elif (latin_letters[0] in table.SUPERJOIN_SET
+          and latin_letters[1] in table.CONSONANT_SET
+          and latin_letters[2] in table.SUB_SET):
         result = dict(super=latin_letters[0],
                       root=latin_letters[1],
                       subjoined=latin_letters[2])
@@ -113,10 +116,10 @@ def vowel_pos_3(latin_letters, table):
 
 
 def vowel_pos_4(latin_letters, table):
-    if not (latin_letters[0] in table['PREFIXES']
-            and latin_letters[1] in table['SUPERJOIN']
-            and latin_letters[2] in table['CONSONANTS']
-            and latin_letters[3] in table['SUB']):
+    if not (latin_letters[0] in table.PREFIX_SET
+            and latin_letters[1] in table.SUPERJOIN_SET
+            and latin_letters[2] in table.CONSONANT_SET
+            and latin_letters[3] in table.SUB_SET):
         raise ParseError
 
     return dict(
@@ -138,12 +141,32 @@ analyze_syllable = (
 
 TIBETAN_VOWEL_LIMIT = len(analyze_syllable)
 
+# Final states of the Tibetan syllable automaton
+ACCEPTED = 0
+REJECTED = 1    # Not a Tibetan syllable, analyze as Sanskrit
+NO_VOWEL = 2    # Partitions into letters, but has no vowel
+
+# Letters that do not continue a valid onset end up here
+_REJECTING_NODE = {}
+
+# Paths taken by analyze_word, and the reasons for not parsing a word
+TIBETAN = 'tibetan'
+SANSKRIT = 'sanskrit'
+INVALID_TIBETAN = 'invalid tibetan'
+INVALID_SANSKRIT = 'invalid sanskrit'
+
+INVALID_LANGUAGE = {
+    INVALID_TIBETAN: InvalidTibetan,
+    INVALID_SANSKRIT: InvalidSanskrit,
+}
+
 
 # XXX: IS this function really needed?? No vertical stacking after root anyway..
 def find_suffixes(syllable, vowel_position, latin_letters, table):
     '''Identifies the syllable suffixes'''
 
     post_vowels = iter(POSTVOWEL)
+    suffix_sets = table.SUFFIX_SETS
 
     for latin_suffix in latin_letters[vowel_position+1:]:
         try:
@@ -151,13 +174,10 @@ def find_suffixes(syllable, vowel_position, latin_letters, table):
         except StopIteration:
             break   # Disallow multiple genetive vowels
 
-        invalid_suffix = (
-            post_vowel in POSTVOWEL[:2]
-            and latin_suffix not in table['TIBETAN_VOWELS']
-            and latin_suffix not in table['VALID_SUFFIX'][post_vowel]
-        )
+        # Only the suffix and second suffix are restricted
+        valid_suffixes = suffix_sets.get(post_vowel)
 
-        if invalid_suffix:
+        if valid_suffixes is not None and latin_suffix not in valid_suffixes:
             raise ParseError
 
         syllable[post_vowel] = latin_suffix
@@ -165,32 +185,52 @@ def find_suffixes(syllable, vowel_position, latin_letters, table):
     return syllable
 
 
-def letter_partition(string, table, letter_set, char_limit):
+def letter_partition(string, trie):
     '''
-    Checks if the roman character(s) at the end of the wylie/IAST string
-    forms a valid wylie letter and continues backwards through the
-    wylie/IAST string, until the entire wylie string is partitioned.
+    Partitions the wylie/IAST string into its longest matching letters.
+    Raises ParseError if the string does not partition.
     '''
 
-    alphabet = table[letter_set]
-    found = False
+    letters = partition(string, trie)
 
-    while len(string) != 0:
-        for i in range(table[char_limit], 0, -1):
-            part = string[:i]
+    if letters is None:
+        raise ParseError
 
-            if part == '':
-                break
+    yield from letters
 
-            if part == table['GA_PREFIX'] or part in alphabet:
-                found = True
-                yield part
-                string = string[i:]
-            elif i == 1 and part not in alphabet:
-                raise ParseError
 
-    if not found:
-        raise ParseError
+def partition(string, trie):
+    '''
+    Partitions the wylie/IAST string into its longest matching letters in
+    a single left-to-right pass over the compiled letter trie. Every prefix
+    of a letter is a letter (see `tables.build_trie`), so the partition
+    never has to backtrack. Returns None if the string does not partition.
+    '''
+
+    if not string:
+        return None
+
+    letters = []
+    node = trie
+
+    for char in string:
+        child = node.get(char)
+
+        if child is None:
+            if node is trie:
+                return None
+
+            letters.append(node[''])
+            child = trie.get(char)
+
+            if child is None:
+                return None
+
+        node = child
+
+    letters.append(node[''])
+
+    return letters
 
 
 def translate(string):
@@ -198,50 +238,417 @@ def translate(string):
     return parse(string, generate_tables())
 
 
-def parse(string, table):
+def parse(string, table=None):
     '''
     Parses Tibetan syllable string from latin script to unicode,
-    using lookup table.
+    using lookup table. Defaults to the shared tables for default wylie.
     '''
 
-    # Check if what could potentially be valid wylie, is actually Sanskrit
-    if len(string) == 3 and string[:2] in table['S_DOUBLE_CONSONANTS']:
-        sanskrit_quick_check = True
-    # Check for clear case Sanskrit syllables to save time
-    elif any(string.startswith(r) for r in table['S_BASIC_RULES']):
-        sanskrit_quick_check = True
-    elif any(v in string for v in ('ai', 'au')):
-        sanskrit_quick_check = True
+    if table is None:
+        table = generate_tables()
+
+    path, unicode = cached_analyze_word(string, table)
+
+    if unicode is None:
+        raise INVALID_LANGUAGE[path](string)
+
+    return unicode
+
+
+def parse_many(strings, table=None, errors='return'):
+    '''
+    Parses an iterable of syllable strings, analyzing each distinct string
+    once. Returns a list of the Unicode strings in input order. Strings that
+    fail to parse are given by `errors`: 'return' puts the InvalidTibetan or
+    InvalidSanskrit error in their place (shared between repetitions of the
+    string), 'ignore' puts None there and 'raise' raises the first error.
+    '''
+
+    if errors not in ('return', 'ignore', 'raise'):
+        raise ValueError('Unknown errors value: {!r}'.format(errors))
+
+    if table is None:
+        table = generate_tables()
+
+    strings = list(strings)
+    results = {}
+
+    for string in strings:
+        if string in results:
+            continue
+
+        path, unicode = cached_analyze_word(string, table)
+
+        if unicode is None:
+            if errors == 'raise':
+                raise INVALID_LANGUAGE[path](string)
+            elif errors == 'return':
+                unicode = INVALID_LANGUAGE[path](string)
+
+        results[string] = unicode
+
+    return [results[string] for string in strings]
+
+
+def analyze_word(string, table):
+    '''
+    Exception-free analysis behind `parse`, for the hot paths. Returns the
+    path the word took and its Tibetan Unicode: either (TIBETAN, unicode)
+    or (SANSKRIT, unicode), and (INVALID_TIBETAN, None) or
+    (INVALID_SANSKRIT, None) if the word could not be parsed.
+    '''
+
+    syllables = table.SYLLABLES
+
+    if syllables is not None:
+        syllable = syllables.get(string)
+
+        if syllable is not None:
+            return TIBETAN, syllable
+
+    if not sanskrit_quick_check(string, table):
+        state, syllable = recognize_tibetan(string, table)
+
+        if state == ACCEPTED:
+            return TIBETAN, syllable
+        if state == NO_VOWEL:
+            return INVALID_TIBETAN, None
+
+    sanskrit = _sanskrit(string, table)
+
+    if sanskrit is None:
+        return INVALID_SANSKRIT, None
+
+    return SANSKRIT, sanskrit
+
+
+# Default capacity, in words, of the shared parse cache
+PARSE_CACHE_SIZE = 65536
+
+ParseCacheStats = namedtuple('ParseCacheStats', (
+    'hits', 'misses', 'evictions', 'size', 'maxsize',
+    'tibetan', 'sanskrit', 'invalid_tibetan', 'invalid_sanskrit',
+))
+
+_path_counts = Counter()
+_path_counts_lock = threading.Lock()
+
+# Optional persistent tier behind the parse cache, see `use_disk_cache`
+_disk_cache = None
+
+
+def _analyze_uncached(table, string):
+    disk_cache = _disk_cache
+    result = None if disk_cache is None else disk_cache.get(table, string)
+
+    if result is None:
+        counters = stats.counters
+
+        if counters is None:
+            result = analyze_word(string, table)
+        else:
+            result = _analyze_counted(string, table, counters)
+
+        if disk_cache is not None:
+            disk_cache.put(table, string, result)
+
+    with _path_counts_lock:
+        _path_counts[result[0]] += 1
+
+    return result
+
+
+_cached_analyze = lru_cache(PARSE_CACHE_SIZE)(_analyze_uncached)
+
+
+def cached_analyze_word(string, table):
+    '''
+    `analyze_word` through the parse cache, which is shared by every caller in
+    the process and keyed by the table instance and the word.
+    '''
+
+    counters = stats.counters
+
+    if counters is None:
+        return _cached_analyze(table, string)
+
+    start = time.perf_counter()
+    result = _cached_analyze(table, string)
+
+    # The time analyzing a missing word was taken off by _analyze_counted
+    counters.stage_times['lookup'] += time.perf_counter() - start
+    counters.words += 1
+    counters.word_lengths[len(string)] += 1
+
+    return result
+
+
+def _analyze_counted(string, table, counters):
+    '''
+    `analyze_word`, counting the route taken by the word and timing each
+    stage of the analysis (see `stats.STAGES`).
+    '''
+
+    clock = time.perf_counter
+    stage_times = counters.stage_times
+    begin = start = clock()
+
+    def lap(stage):
+        nonlocal start
+        now = clock()
+        stage_times[stage] += now - start
+        start = now
+
+    result = None
+    counters.analyzed += 1
+
+    if table.SYLLABLES is not None:
+        syllable = table.SYLLABLES.get(string)
+
+        if syllable is not None:
+            counters.syllable_lookups += 1
+            result = TIBETAN, syllable
+
+    if result is None:
+        quick_sanskrit = sanskrit_quick_check(string, table)
+        lap('route')
+
+        if quick_sanskrit:
+            counters.sanskrit_route += 1
+
+            # Accuracy of the quick check, left out of the stage times
+            if recognize_tibetan(string, table)[0] == ACCEPTED:
+                counters.sanskrit_misroutes += 1
+
+            start = clock()
+        else:
+            state, syllable = recognize_tibetan(string, table)
+            lap('tibetan')
+
+            if state == ACCEPTED:
+                result = TIBETAN, syllable
+            elif state == NO_VOWEL:
+                result = INVALID_TIBETAN, None
+            else:
+                counters.tibetan_fallbacks += 1
     else:
-        sanskrit_quick_check = (
-            table['LATIN_A_CHUNG'] not in string
-            and len(tuple(c for c in string
-                          if c in table['TIBETAN_VOWELS'])) >= 2
-        )
+        lap('route')
 
-    is_sanskrit = (
-        sanskrit_quick_check or (
-            not string.startswith(table['GA_PREFIX'])
-            and not set(string) <= table['LATIN_TIBETAN_ALPHABET_SET']
-        )
+    if result is None:
+        latin_letters = partition(string, table.INDIC_TRIE)
+        lap('partition')
+        sanskrit = None
+
+        if latin_letters is not None:
+            letter_stacks = generate_stacks(latin_letters, table)
+            lap('analysis')
+            sanskrit = sanskrit_unicode(string, letter_stacks, table)
+            lap('unicode')
+
+        if sanskrit is None:
+            result = INVALID_SANSKRIT, None
+        else:
+            result = SANSKRIT, sanskrit
+
+    counters.paths[result[0]] += 1
+    stage_times['lookup'] -= clock() - begin
+
+    return result
+
+
+def configure_parse_cache(maxsize=PARSE_CACHE_SIZE):
+    '''
+    Replaces the parse cache with an empty one holding up to `maxsize` words,
+    and resets its statistics. None means unbounded and 0 disables caching.
+    '''
+
+    global _cached_analyze
+
+    _cached_analyze = lru_cache(maxsize)(_analyze_uncached)
+
+    with _path_counts_lock:
+        _path_counts.clear()
+
+
+def clear_parse_cache():
+    ''' Empties the parse cache and resets its statistics '''
+
+    configure_parse_cache(_cached_analyze.cache_info().maxsize)
+
+
+def use_disk_cache(disk_cache):
+    '''
+    Puts a `disk_cache.DiskCache` behind the parse cache, so that words missing
+    from memory are looked up in, and stored to, its file. None removes it.
+    '''
+
+    global _disk_cache
+
+    if _disk_cache is not None and _disk_cache is not disk_cache:
+        _disk_cache.flush()
+
+    _disk_cache = disk_cache
+
+
+def get_disk_cache():
+    ''' The disk cache set by `use_disk_cache`, or None '''
+    return _disk_cache
+
+
+def flush_disk_cache():
+    ''' Writes the pending entries of the disk cache in use, if any '''
+
+    if _disk_cache is not None:
+        _disk_cache.flush()
+
+
+def parse_cache_stats():
+    '''
+    Statistics of the parse cache since it was last configured or cleared.
+    The path counts are of the words analyzed, i.e. the misses, per path.
+    '''
+
+    info = _cached_analyze.cache_info()
+
+    with _path_counts_lock:
+        paths = dict(_path_counts)
+
+    # lru_cache only stores misses, so the ones not stored were evicted
+    evictions = info.misses - info.currsize if info.maxsize else 0
+
+    return ParseCacheStats(
+        hits=info.hits,
+        misses=info.misses,
+        evictions=evictions,
+        size=info.currsize,
+        maxsize=info.maxsize,
+        tibetan=paths.get(TIBETAN, 0),
+        sanskrit=paths.get(SANSKRIT, 0),
+        invalid_tibetan=paths.get(INVALID_TIBETAN, 0),
+        invalid_sanskrit=paths.get(INVALID_SANSKRIT, 0),
     )
 
-    if is_sanskrit:
-        return analyze_sanskrit(string, table)
 
-    try:
-        latin_letters = tuple(letter_partition(
-            string,
-            table,
-            letter_set='LATIN_TIBETAN_ALPHABET_SET',
-            char_limit='MAX_TIB_CHAR_LEN'
-        ))
-    except ParseError:
-        return analyze_sanskrit(string, table)
+def enumerate_syllables(table):
+    '''
+    Yields the wylie and Unicode of every syllable of the common shape (see
+    `tables.syllable_candidates`) that parses as Tibetan.
+    '''
+
+    for wylie in set(syllable_candidates(table)):
+        path, unicode = analyze_word(wylie, table)
+
+        if path == TIBETAN:
+            yield wylie, unicode
+
+
+def sanskrit_quick_check(string, table):
+    '''
+    Tells clear cases of Sanskrit apart, before any analysis, in a single
+    scan of string (see `tables.compile_sanskrit_detector`)
+    '''
+
+    node = table.SANSKRIT_PREFIXES
+    classes = table.SANSKRIT_CHAR_CLASSES
+    ga_prefixed = a_chung = False
+    vowels = 0
+    seen = 0
+
+    for index, char in enumerate(string):
+        if node is not None:
+            node = node.get(char)
+
+            if node is not None:
+                rule = node.get('', 0)
+
+                # Check for clear case Sanskrit syllables to save time
+                if rule & PREFIX_SANSKRIT:
+                    return True
+                # Check if what could potentially be valid wylie, is
+                # actually Sanskrit
+                if rule & PREFIX_DOUBLE and len(string) == 3:
+                    return True
+                if rule & PREFIX_GA:
+                    ga_prefixed = True
+
+        char_class = classes.get(char, CHAR_NON_TIBETAN)
+
+        if not char_class:
+            continue
+
+        seen |= char_class
+
+        if char_class & CHAR_VOWEL:
+            vowels += 1
+        if (char_class & CHAR_DIPHTHONG and index
+           and string[index - 1] == 'a'):
+            return True
+        if char_class & CHAR_A_CHUNG and not a_chung:
+            a_chung = string.startswith(table.LATIN_A_CHUNG, index)
+
+    if vowels >= 2 and not a_chung:
+        return True
+
+    return bool(seen & CHAR_NON_TIBETAN) and not ga_prefixed
+
+
+def recognize_tibetan(string, table):
+    '''
+    Runs the compiled syllable automaton (see
+    `tables.compile_onset_automaton` and `tables.compile_suffix_automaton`)
+    over the letters of string.
+    Returns the final state and the Tibetan Unicode, which is None unless
+    the syllable was ACCEPTED.
+    '''
+
+    letters = partition(string, table.TIBETAN_TRIE)
 
+    if letters is None:
+        return REJECTED, None
+
+    vowels = table.TIBETAN_VOWEL_SET
+    node = table.ONSET_AUTOMATON
+    letters = iter(letters)
+
+    for letter in letters:
+        if letter in vowels:
+            break
+
+        node = node.get(letter, _REJECTING_NODE)
+    else:
+        return NO_VOWEL, None
+
+    onset = node.get('')
+
+    if onset is None:
+        return REJECTED, None
+
+    syllable = onset + table.VOWEL_UNICODE[letter]
+
+    # Letters beyond the genitive vowel are dropped
+    for post_vowel, letter in zip(table.SUFFIX_AUTOMATON, letters):
+        char = post_vowel.get(letter)
+
+        if char is None:
+            return REJECTED, None
+
+        syllable += char
+
+    return ACCEPTED, syllable
+
+
+def analyze_tibetan(string, table):
+    '''
+    Reference implementation of the Tibetan analysis, through the vowel
+    position cascade. Raises ParseError where `recognize_tibetan` rejects.
+    '''
+
+    latin_letters = tuple(letter_partition(string, table.TIBETAN_TRIE))
+
+    vowels = table.TIBETAN_VOWEL_SET
     vowel_indices = (
         index for index, char in enumerate(latin_letters)
-        if char in table['TIBETAN_VOWELS']
+        if char in vowels
     )
 
     try:
@@ -250,35 +657,34 @@ def parse(string, table):
         raise InvalidTibetan(string)
 
     if first_vowel_index >= TIBETAN_VOWEL_LIMIT:
-        return analyze_sanskrit(string, table)
+        raise ParseError
 
-    try:
-        syllable = analyze_syllable[first_vowel_index](latin_letters, table)
-        find_suffixes(syllable, first_vowel_index, latin_letters, table)
-    except ParseError:
-        return analyze_sanskrit(string, table)
+    syllable = analyze_syllable[first_vowel_index](latin_letters, table)
+    find_suffixes(syllable, first_vowel_index, latin_letters, table)
 
     return ''.join(to_unicode(syllable, table))
 
 
 def atleast_n_vowels(string, n, table):
     '''String contains more than n tibetan vowels'''
-    vowels = tuple(c for c in string if c in table['TIBETAN_VOWELS'])
-    return len(vowels) >= n
+    vowels = table.TIBETAN_VOWEL_SET
+    return sum(1 for c in string if c in vowels) >= n
 
 
 def to_unicode(syllable, table):
     '''Generator yields tibetan unicode from latin syllable'''
+    tibetan_unicode = table.TIBETAN_UNICODE
+
     for syllable_component, latin_char in syllable.items():
-        if latin_char == table['LATIN_VOWEL_A']\
+        if latin_char == table.LATIN_VOWEL_A\
            and syllable_component != 'root':
             continue
 
-        if latin_char in table['W_VOWELS'] and syllable_component == 'root':
-            yield table['TIBETAN_UNICODE'][table['LATIN_VOWEL_A']]
+        if latin_char in table.W_VOWEL_SET and syllable_component == 'root':
+            yield tibetan_unicode[table.LATIN_VOWEL_A]
 
-        if latin_char == table['GA_PREFIX']:
-            latin_char = table['CONSONANTS'][2]
+        if latin_char == table.GA_PREFIX:
+            latin_char = table.CONSONANTS[2]
             syllable[syllable_component] = latin_char
 
         needs_subjoin = (
@@ -288,22 +694,23 @@ def to_unicode(syllable, table):
         )
 
         if needs_subjoin:
-            yield chr(SUBOFFSET + ord(table['TIBETAN_UNICODE'][latin_char]))
+            yield chr(SUBOFFSET + ord(tibetan_unicode[latin_char]))
         else:
-            yield table['TIBETAN_UNICODE'][latin_char]
+            yield tibetan_unicode[latin_char]
 
 
 def generate_stacks(latin_letters, table):
     ''' Group letters into stacks, represented by a list '''
 
     stack = []
+    vowels = table.SW_VOWEL_SET
     prev, curr = itertools.tee(latin_letters)
     curr_char = next(curr, None)
 
     for prev_char, curr_char in zip(prev, curr):
         stack.append(prev_char)
-        prev_is_vowel = prev_char in table['SW_VOWELS']
-        curr_is_vowel = curr_char in table['SW_VOWELS']
+        prev_is_vowel = prev_char in vowels
+        curr_is_vowel = curr_char in vowels
 
         if prev_is_vowel and curr_is_vowel:
             continue
@@ -318,89 +725,127 @@ def generate_stacks(latin_letters, table):
 
 
 def generate_sanskrit_unicode(latin_string, letter_stacks, table):
-    try:
-        yield table['SPECIAL_CASE'][latin_string]
-        return
-    except KeyError:
-        pass
+    sanskrit = sanskrit_unicode(latin_string, letter_stacks, table)
+
+    if sanskrit is None:
+        raise KeyError(latin_string)
+
+    yield sanskrit
+
+
+def sanskrit_unicode(latin_string, letter_stacks, table):
+    '''
+    Joins the Tibetan Unicode of the Sanskrit letter stacks. Returns None if
+    a letter has no Tibetan Unicode.
+    '''
+
+    special_case = table.SPECIAL_CASE.get(latin_string)
+
+    if special_case is not None:
+        return special_case
 
-    literal_va = table['SW_ROOTLETTERS'][28]
-    literal_ba = table['CONSONANTS'][14]
-    literal_rv = table['SW_ROOTLETTERS'][26] + table['SW_ROOTLETTERS'][28]
+    tibindic_unicode = table.TIBINDIC_UNICODE
+    vowels = table.SW_VOWEL_SET
+    vowel_a = table.LATIN_VOWEL_A
+    literal_va = table.SW_ROOTLETTERS[28]
+    literal_ba = table.CONSONANTS[14]
+    literal_ra = table.SW_ROOTLETTERS[26]
+    subjoin_rules = table.SW_SUBJOIN_RULES
+    subjoin_contexts = table.SW_SUBJOIN
+    chars = []
 
     for stack in letter_stacks:
-        if stack[0] in table['SW_VOWELS'][1:]:   # avoid leading `a`
-            yield table['TIBINDIC_UNICODE'][table['LATIN_VOWEL_A']]
-            yield table['TIBINDIC_UNICODE'][stack[0]]
+        if stack[0] in vowels and stack[0] != table.SW_VOWELS[0]:
+            # avoid leading `a`
+            chars.append(tibindic_unicode[vowel_a])
+            char = tibindic_unicode.get(stack[0])
         elif stack[0] == literal_va:
-            yield table['TIBINDIC_UNICODE'][literal_ba]
+            char = tibindic_unicode.get(literal_ba)
         else:
-            yield table['TIBINDIC_UNICODE'][stack[0]]
+            char = tibindic_unicode.get(stack[0])
 
-        stacked_letters = stack[1:]
+        if char is None:
+            return None
 
-        for letter in stacked_letters:
-            if letter == table['LATIN_VOWEL_A']:
+        chars.append(char)
+        last = len(stack) - 1
+        rv_stack = (last > 0 and stack[0] == literal_ra
+                    and stack[1] == literal_va)
+
+        for position in range(1, last + 1):
+            letter = stack[position]
+
+            if letter == vowel_a:
                 continue
 
             sna_ldan_case = (
-                letter == table['SW_VOWELS'][-2]
-                and latin_string in table['SNA_LDAN_CASES']
+                letter == table.SW_VOWELS[-2]
+                and latin_string in table.SNA_LDAN_SET
             )
 
             if sna_ldan_case:
-                yield U_SNA_LDAN
+                chars.append(U_SNA_LDAN)
                 continue
 
-            if letter in table['SW_VOWELS']:
-                yield table['TIBINDIC_UNICODE'][letter]
+            if letter in vowels:
+                chars.append(tibindic_unicode[letter])
                 continue
 
-            if ''.join(stack[:2]) == literal_rv:
-                yield (
-                    chr(SUBOFFSET +
-                        ord(table['TIBINDIC_UNICODE'][literal_ba]))
-                )
+            if rv_stack:
+                char = tibindic_unicode.get(literal_ba)
+
+                if char is None:
+                    return None
+
+                chars.append(chr(SUBOFFSET + ord(char)))
                 continue
 
-            # letter is 'y', 'r' or 'v'
-            subjoin_special_case = (
-                letter == table['SW_ROOTLETTERS'][25]
-                or letter == table['SW_ROOTLETTERS'][26]
-                or letter == table['SW_ROOTLETTERS'][28]
-            )
+            char = tibindic_unicode.get(letter)
 
-            if subjoin_special_case:
-                if stack.index(letter) < len(stack)-2:
-                    yield table['STACK'][letter]
-                    continue
+            if char is None:
+                return None
 
-                subjoin = None
+            # letter is 'y', 'r' or 'v'
+            if letter in subjoin_rules:
+                if position < last - 1:
+                    chars.append(table.STACK[letter])
+                    continue
 
-                for regex in table['SW_REGEX'][letter]:
-                    if regex.search(''.join(stack)):
-                        subjoin = chr(
-                            SUBOFFSET +
-                            ord(table['TIBINDIC_UNICODE'][letter])
-                        )
-                        break
+                prev = stack[position - 1]
+                following = stack[position + 1] if position < last else None
+                subjoined = (
+                    (prev, letter, following) in subjoin_contexts
+                    or position > 1
+                    and ((stack[position - 2], prev), letter, following)
+                    in subjoin_contexts
+                )
 
-                yield subjoin or table['STACK'][letter]
+                if subjoined:
+                    chars.append(chr(SUBOFFSET + ord(char)))
+                else:
+                    chars.append(table.STACK[letter])
                 continue
 
-            yield chr(SUBOFFSET + ord(table['TIBINDIC_UNICODE'][letter]))
+            chars.append(chr(SUBOFFSET + ord(char)))
+
+    return ''.join(chars)
 
 
 def analyze_sanskrit(latin_string, table):
-    try:
-        latin_letters = letter_partition(
-            latin_string,
-            table,
-            letter_set='LATIN_INDIC_ALPHABET_SET',
-            char_limit='MAX_INDIC_CHAR_LEN'
-        )
-        letter_stacks = generate_stacks(latin_letters, table)
-        sanskrit = generate_sanskrit_unicode(latin_string, letter_stacks, table)
-        return ''.join(sanskrit)
-    except (KeyError, ParseError):
+    sanskrit = _sanskrit(latin_string, table)
+
+    if sanskrit is None:
         raise InvalidSanskrit(latin_string)
+
+    return sanskrit
+
+
+def _sanskrit(latin_string, table):
+    latin_letters = partition(latin_string, table.INDIC_TRIE)
+
+    if latin_letters is None:
+        return None
+
+    letter_stacks = generate_stacks(latin_letters, table)
+
+    return sanskrit_unicode(latin_string, letter_stacks, table)
@@ -0,0 +1,204 @@
+'''
+Persistent tier behind the parse cache. A SQLite file maps the content
+fingerprint of the tables, and a word, to the analysis of the word, so that
+conversions can start warm across processes and restarts.
+'''
+
+import os
+import threading
+
+from pytib.tables import content_fingerprint
+from pytib.version import __version__, ANALYSIS_VERSION
+
+# Number of words kept in the file, oldest are evicted first
+DISK_CACHE_SIZE = 1000000
+
+# Number of new words written to the file in one transaction
+DISK_CACHE_BATCH = 1000
+
+# Version of the layout of the file
+DISK_CACHE_FORMAT = 1
+
+_SCHEMA = (
+    '''CREATE TABLE IF NOT EXISTS meta (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+    )''',
+    '''CREATE TABLE IF NOT EXISTS tables (
+        id INTEGER PRIMARY KEY,
+        fingerprint TEXT NOT NULL UNIQUE
+    )''',
+    '''CREATE TABLE IF NOT EXISTS words (
+        id INTEGER PRIMARY KEY,
+        tables INTEGER NOT NULL,
+        word TEXT NOT NULL,
+        path TEXT NOT NULL,
+        unicode TEXT,
+        UNIQUE (tables, word)
+    )''',
+)
+
+# Connections inherited from a parent process. Closing these could checkpoint
+# or remove the journal the parent is using, so they are never closed.
+_inherited_connections = []
+
+
+class DiskCache:
+    '''
+    Word analyses stored in the SQLite file at `path`, as returned by
+    `core.analyze_word`. Entries are looked up by the content of the tables
+    (see `tables.content_fingerprint`), so tables that compile differently
+    never share entries, and the file is emptied when opened by another
+    version of pytib, of the file layout or of the analysis (see
+    `version.ANALYSIS_VERSION`). New entries are written in batches of
+    `batch_size`, and the file keeps the newest `max_entries` words.
+    '''
+
+    def __init__(self, path, max_entries=DISK_CACHE_SIZE,
+                 batch_size=DISK_CACHE_BATCH):
+        self.path = os.fspath(path)
+        self.max_entries = max_entries
+        self.batch_size = batch_size
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self._lock = threading.Lock()
+        self._connection = None
+        self._pid = None
+        self._table_ids = {}
+        self._pending = {}
+
+    def __reduce__(self):
+        return DiskCache, (self.path, self.max_entries, self.batch_size)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def get(self, table, word):
+        ''' The analysis of word stored for table, or None '''
+
+        with self._lock:
+            connection = self._connect()
+            table_id = self._table_id(connection, table)
+            result = self._pending.get((table_id, word))
+
+            if result is None:
+                result = connection.execute(
+                    'SELECT path, unicode FROM words '
+                    'WHERE tables = ? AND word = ?',
+                    (table_id, word)
+                ).fetchone()
+
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+
+            return result
+
+    def put(self, table, word, result):
+        ''' Stores the analysis of word for table, with the next batch '''
+
+        with self._lock:
+            connection = self._connect()
+            self._pending[self._table_id(connection, table), word] = result
+
+            if len(self._pending) >= self.batch_size:
+                self._write(connection)
+
+    def flush(self):
+        ''' Writes the pending entries to the file '''
+
+        with self._lock:
+            if self._pending:
+                self._write(self._connect())
+
+    def close(self):
+        self.flush()
+
+        with self._lock:
+            if self._connection is not None and self._pid == os.getpid():
+                self._connection.close()
+
+            self._connection = None
+
+    def _connect(self):
+        if self._connection is not None and self._pid == os.getpid():
+            return self._connection
+
+        if self._connection is not None:
+            # Forked: the entries pending are written by the parent
+            _inherited_connections.append(self._connection)
+            self._pending = {}
+
+        # Imported with the first cache opened, not by every CLI run
+        import sqlite3
+
+        connection = sqlite3.connect(self.path, timeout=30,
+                                     check_same_thread=False)
+        connection.execute('PRAGMA journal_mode=WAL')
+
+        with connection:
+            for statement in _SCHEMA:
+                connection.execute(statement)
+
+            version = f'{__version__} {DISK_CACHE_FORMAT} {ANALYSIS_VERSION}'
+            row = connection.execute(
+                "SELECT value FROM meta WHERE key = 'version'").fetchone()
+
+            if row is None or row[0] != version:
+                connection.execute('DELETE FROM words')
+                connection.execute('DELETE FROM tables')
+                connection.execute(
+                    "INSERT OR REPLACE INTO meta VALUES ('version', ?)",
+                    (version,)
+                )
+
+        self._connection = connection
+        self._pid = os.getpid()
+        self._table_ids = {}
+        return connection
+
+    def _table_id(self, connection, table):
+        try:
+            return self._table_ids[table]
+        except KeyError:
+            pass
+
+        fingerprint = content_fingerprint(table)
+
+        with connection:
+            connection.execute(
+                'INSERT OR IGNORE INTO tables (fingerprint) VALUES (?)',
+                (fingerprint,)
+            )
+            table_id, = connection.execute(
+                'SELECT id FROM tables WHERE fingerprint = ?', (fingerprint,)
+            ).fetchone()
+
+        self._table_ids[table] = table_id
+        return table_id
+
+    def _write(self, connection):
+        with connection:
+            connection.executemany(
+                'INSERT OR IGNORE INTO words (tables, word, path, unicode) '
+                'VALUES (?, ?, ?, ?)',
+                ((table_id, word, path, unicode) for (table_id, word),
+                 (path, unicode) in self._pending.items())
+            )
+
+            size, = connection.execute('SELECT count(*) FROM words').fetchone()
+
+            if size > self.max_entries:
+                connection.execute(
+                    'DELETE FROM words WHERE id IN '
+                    '(SELECT id FROM words ORDER BY id LIMIT ?)',
+                    (size - self.max_entries,)
+                )
+
+        self.writes += len(self._pending)
+        self._pending = {}
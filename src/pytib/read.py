@@ -1,101 +1,501 @@
+import io
+import os
+import mmap
+import stat
+import time
 import logging
 
-from typing import Iterable
-from functools import lru_cache
+from enum import IntEnum
+from collections import deque
+from collections.abc import Iterable
 
-from pytib.core import parse
-from pytib.tables import (U_SHADS, U_TSHEG, generate_tables)
-from pytib.exceptions import InvalidLanguage
+from pytib.core import (cached_analyze_word, configure_parse_cache,
+                        INVALID_LANGUAGE, parse_cache_stats, use_disk_cache,
+                        get_disk_cache, flush_disk_cache)
+from pytib.tables import (U_SHADS, U_TSHEG, LINE_BREAKS, generate_tables)
+from pytib import stats
 
 logger = logging.getLogger('pytib.core')
 
+CHUNK_SIZE = 1 << 16
+# Characters of output buffered by read_into between writes
+WRITE_SIZE = 1 << 16
+
+
+class Kind(IntEnum):
+    ''' Kinds of tokens, numbered as the groups of `tables.compile_lexer` '''
+
+    LINE_BREAK = 1
+    SPACE = 2
+    SHAD = 3
+    PUNCTUATION = 4
+    WORD = 5        # a word that did not parse
+    SYLLABLE = 6    # a word parsed to Tibetan Unicode
+
+
+# A token is a (kind, text) pair. Its kind is the number of the lexer group
+# that matched, or SYLLABLE once the word is parsed.
+
+# Separators before a token, indexed by its kind, by what the line ends with.
+# These are the states of `_join_tokens`.
+_KIND_COUNT = len(Kind) + 1
+LINE_START = ('',) * _KIND_COUNT
+# a syllable, which a syllable or shad joins with a tsheg
+SEGMENT_OPEN = tuple(U_TSHEG if kind in (Kind.SYLLABLE, Kind.SHAD) else ' '
+                     for kind in range(_KIND_COUNT))
+SEGMENT_CLOSED = (' ',) * _KIND_COUNT
+
+# Bounds, in characters, of the line-aligned chunks sent to worker processes
+MIN_CHUNK_CHARS = 1 << 14
+MAX_CHUNK_CHARS = 1 << 22
+
 
 def read(content, table=None):
     '''
-    Parses latin content from file or string to tibetan unicode.
+    Parses latin content to tibetan unicode. Content can be a string, a text
+    stream or an iterable of lines, and is converted as it is read: memory use
+    is bounded by the longest word, not by the size of content or its lines.
+    Trailing blank lines are dropped, as in `content.rstrip().splitlines()`.
     PLEASE NOTE: Always creates trailing newline! Use rstrip() to remove.
     '''
 
     if table is None:
         table = generate_tables()
 
-    words = (line.split() for line in content.rstrip().splitlines())
+    for run in _convert(content, table):
+        yield from run
 
-    for line in _generate_tibetan_lines(words, table):
-        for i, segment in enumerate(line):
-            if not segment:
-                continue
-            elif not isinstance(segment, list):
-                print(segment)
-                yield segment
-            elif _not_tibetan(segment[-1]):
-                if _tsheg_before_shad(segment, table):
-                    yield U_TSHEG.join(segment)
-                else:
-                    yield ' '.join(segment)
-            else:
-                yield U_TSHEG.join(segment)
 
-            # Join line segments with a space, but don't create trailing spaces,
-            # and account for line[-1] == []
-            if i < (len(line) - (2 if not line[-1] else 1)):
-                yield ' '
+def read_into(content, out, table=None, jobs=1):
+    '''
+    Converts content like `read`, writing the output UTF-8 encoded to the
+    binary stream out, in writes of about WRITE_SIZE characters. With jobs
+    other than 1, content is converted as by `read_parallel`. Returns the
+    number of characters written.
+    '''
 
-        yield '\n'
+    if table is None:
+        table = generate_tables()
 
+    if jobs == 1:
+        runs = map(''.join, _convert(content, table))
+    else:
+        runs = read_parallel(content, table, jobs)
 
-def _tsheg_before_shad(segment, table):
-    ''' Tests if the current word is shad and the word before ends with nga '''
-    return (
-        len(segment) > 1
-        and segment[-1] in U_SHADS
-        and len(segment[-2]) > 1
-        and segment[-2][-2:] == table['CONSONANTS'][3]
-    )
+    return write_buffered(runs, out)
 
 
-def _not_tibetan(word):
-    v = ord(word[0])
-    return v < 0x0f00 or v > 0x0fff
+def write_buffered(strings, out):
+    '''
+    Writes strings UTF-8 encoded to the binary stream out, in writes of about
+    WRITE_SIZE characters. Returns the number of characters written.
+    '''
 
+    buffered = []
+    size = written = 0
 
-def _not_latin_letter(char, table):
-    return char not in table['LATIN_TIBETAN_ALPHABET'] and not char.isalpha()
+    for string in strings:
+        buffered.append(string)
+        size += len(string)
 
+        if size >= WRITE_SIZE:
+            out.write(''.join(buffered).encode('utf-8'))
+            written += size
+            buffered.clear()
+            size = 0
 
-def _partition_word(word: str, table) -> Iterable[str]:
-    ''' Splits words if word contains separator (shad) marks. '''
+    if buffered:
+        out.write(''.join(buffered).encode('utf-8'))
+        written += size
+
+    return written
+
+
+def read_words(content, table=None):
+    '''
+    Yields each word of content, read as by `read`, with the path it took
+    and its Unicode, None if it could not be parsed (see
+    `core.analyze_word`). Shads and other punctuation are not words.
+    '''
+
+    if table is None:
+        table = generate_tables()
+
+    word = Kind.WORD
+
+    for run in _read_tokens(content, table.LEXER):
+        for kind, text in run:
+            if kind == word:
+                yield (text, *cached_analyze_word(text, table))
+
+
+def read_checked(content, table=None):
+    '''
+    Converts content like `read`, returning the output and the errors of the
+    words that could not be parsed, InvalidTibetan or InvalidSanskrit, in
+    the order the words occur.
+    '''
+
+    if table is None:
+        table = generate_tables()
+
+    errors = []
+
+    def analyze(word, table):
+        path, unicode = cached_analyze_word(word, table)
+
+        if unicode is None:
+            errors.append(INVALID_LANGUAGE[path](word))
+
+        return path, unicode
+
+    runs = _join_tokens(_read_tokens(content, table.LEXER), table, analyze)
+    return ''.join(map(''.join, runs)), errors
+
+
+def _convert(content, table):
+    ''' Runs of the output of content, as lists of strings '''
+
+    output = _join_tokens(_read_tokens(content, table.LEXER), table)
 
-    punctuation_indices = list(word.find(p) for p in table['PUNCTUATION_CHARS'])
+    if stats.counters is not None:
+        output = _count_joining(output, stats.counters)
 
-    if not any(shad_index > -1 for shad_index in punctuation_indices):
-        yield word
+    return output
+
+
+def _count_joining(output, counters):
+    '''
+    Passes output on, adding the time spent generating it, less the time
+    spent parsing, to the joining stage.
+    '''
+
+    stage_times = counters.stage_times
+
+    while True:
+        start = time.perf_counter()
+        parsing = sum(stage_times.values())
+
+        try:
+            item = next(output)
+        except StopIteration:
+            item = None
+
+        parsing = sum(stage_times.values()) - parsing
+        stage_times['joining'] += time.perf_counter() - start - parsing
+
+        if item is None:
+            return
+
+        yield item
+
+
+def read_parallel(content, table=None, jobs=None):
+    '''
+    Parses latin content like `read`, in a pool of `jobs` worker processes
+    (all CPUs if None). Content is split into line-aligned chunks, which are
+    converted in parallel and yielded in order, so the output is the same as
+    that of `read`. The table is sent to each worker once. Chunks grow with
+    the input size, or from MIN_CHUNK_CHARS if the size is unknown.
+
+    A text stream of a regular file is memory-mapped instead: the chunks are
+    found on its raw bytes and handed to the workers as byte offsets, and
+    each worker decodes only its own chunk.
+    '''
+
+    if table is None:
+        table = generate_tables()
+
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+
+    if jobs <= 1:
+        yield from read(content, table)
         return
 
-    remainder = word
+    chunk_size = _chunk_chars(content, jobs)
+    mapped = _map_stream(content)
+
+    if mapped is not None:
+        chunks = _file_slices(content, mapped, chunk_size)
+    else:
+        chunks = _line_chunks(content, chunk_size)
+
+    pending = deque()
+    blank_lines = 0
+
+    # Imported here, as it pulls in multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    flush_disk_cache()
+    initargs = (table, parse_cache_stats().maxsize, get_disk_cache(),
+                stats.counters is not None)
+
+    with ProcessPoolExecutor(jobs, initializer=_init_worker,
+                             initargs=initargs) as executor:
+        # Keep a bounded number of chunks in flight, to bound memory use
+        for chunk in chunks:
+            pending.append(executor.submit(_convert_chunk, chunk))
+
+            if len(pending) < 2 * jobs:
+                continue
+
+            output, blank_lines = _join_chunk(pending.popleft().result(),
+                                              blank_lines)
+            yield output
+
+        while pending:
+            output, blank_lines = _join_chunk(pending.popleft().result(),
+                                              blank_lines)
+            yield output
+
+
+def _chunk_chars(content, jobs):
+    '''
+    Chunk size in characters, aiming at a few chunks per job. Returns None if
+    the size of content is unknown, as for pipes.
+    '''
+
+    if isinstance(content, str):
+        size = len(content)
+    else:
+        try:
+            status = os.fstat(content.fileno())
+        except (AttributeError, OSError, io.UnsupportedOperation):
+            return None
+
+        if not stat.S_ISREG(status.st_mode):
+            return None
+
+        size = status.st_size
+
+    return max(MIN_CHUNK_CHARS, min(MAX_CHUNK_CHARS, size // (8 * jobs)))
+
+
+def _line_chunks(content, chunk_chars):
+    '''
+    Groups the lines of content into chunks of about `chunk_chars` characters.
+    Without a chunk size, chunks start at MIN_CHUNK_CHARS and double in size.
+    '''
+
+    if isinstance(content, str):
+        content = io.StringIO(content)
+
+    target = chunk_chars or MIN_CHUNK_CHARS
+    chunk = []
+    size = 0
+
+    for line in content:
+        if not line or line[-1] not in LINE_BREAKS:
+            line += '\n'
 
-    while remainder != '':
-        for punctuation in table['PUNCTUATION_CHARS']:
-            part, separator, new_remainder = remainder.partition(punctuation)
-            contains_punctuation = separator != ''
+        chunk.append(line)
+        size += len(line)
 
-            if contains_punctuation:
-                if part:
-                    yield part
+        if size >= target:
+            yield ''.join(chunk)
+            chunk = []
+            size = 0
 
-                yield separator
-                remainder = new_remainder
-                break
-        else:
-            yield part
-            remainder = new_remainder
+            if chunk_chars is None:
+                target = min(2 * target, MAX_CHUNK_CHARS)
+
+    if chunk:
+        yield ''.join(chunk)
+
+
+def _map_stream(content):
+    '''
+    Read-only memory map of the regular file under the text stream content,
+    or None unless the stream is unread, named by a path, and in an encoding
+    where the byte of a line feed is only ever a line feed, as in UTF-8
+    '''
+
+    try:
+        if (not isinstance(content.name, str) or content.tell() != 0
+                or '\n'.encode(content.encoding) != b'\n'):
+            return None
+
+        status = os.fstat(content.fileno())
+
+        if not stat.S_ISREG(status.st_mode) or not status.st_size:
+            return None
+
+        return mmap.mmap(content.fileno(), 0, access=mmap.ACCESS_READ)
+    except (AttributeError, OSError, ValueError, LookupError,
+            io.UnsupportedOperation):
+        return None
+
+
+def _file_slices(content, mapped, chunk_bytes):
+    '''
+    Splits the mapped file of the text stream content after the first line
+    feed past every `chunk_bytes` bytes, yielding each chunk as the path,
+    start and end offsets, encoding and errors to decode it with
+    '''
+
+    path = os.path.abspath(content.name)
+    chunk_bytes = chunk_bytes or MIN_CHUNK_CHARS
+    start = 0
+
+    with mapped:
+        size = len(mapped)
+
+        while start < size:
+            end = mapped.find(b'\n', start + chunk_bytes - 1) + 1 or size
+            yield (path, start, end, content.encoding, content.errors)
+            start = end
+
+
+# Memory maps of the files a worker process was handed slices of
+_worker_maps = {}
+
+
+def _read_slice(path, start, end, encoding, errors):
+    ''' Text of a slice yielded by `_file_slices`, in a worker process '''
+
+    mapped = _worker_maps.get(path)
+
+    if mapped is None:
+        with open(path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        _worker_maps[path] = mapped
+
+    return mapped[start:end].decode(encoding, errors)
+
+
+def _join_chunk(result, blank_lines):
+    '''
+    Output of a converted chunk, preceded by the blank lines held back from
+    earlier chunks, and the number of blank lines to hold back after it.
+    '''
+
+    output, trailing_blank_lines, counters = result
+
+    if counters is not None and stats.counters is not None:
+        stats.counters.merge(counters)
+
+    if not output:
+        return '', blank_lines + trailing_blank_lines
+
+    return '\n' * blank_lines + output, trailing_blank_lines
+
+
+_worker_table = None
+
+
+def _init_worker(table, cache_size, disk_cache, count):
+    global _worker_table
+    _worker_table = table
+
+    # Forked workers inherit the counters of the parent, so count from zero
+    if count:
+        stats.enable()
+    else:
+        stats.disable()
+
+    # Forked workers inherit the parse cache, others start with a new one
+    if parse_cache_stats().maxsize != cache_size:
+        configure_parse_cache(cache_size)
+
+    use_disk_cache(disk_cache)
+
+
+def _convert_chunk(chunk):
+    '''
+    Converts a chunk of lines, or a slice of a file, in a worker process.
+    Returns the output, the number of blank lines at the end of the chunk,
+    which `read` leaves out, and the instrumentation counts of the chunk if
+    counting.
+    '''
+
+    if not isinstance(chunk, str):
+        chunk = _read_slice(*chunk)
+
+    output = ''.join(map(''.join, _convert(chunk, _worker_table)))
+    # Worker processes end without running exit handlers
+    flush_disk_cache()
+    content = chunk.rstrip()
+    blank_lines = len(chunk[len(content):].splitlines())
+
+    if content:
+        # The first line break ends the last line with words
+        blank_lines = max(blank_lines - 1, 0)
+
+    counters = None
+
+    if stats.counters is not None:
+        counters = stats.disable()
+        stats.enable()
+
+    return output, blank_lines, counters
+
+
+def _read_tokens(content, lexer):
+    '''
+    Yields runs of the tokens of content, as lists. Line breaks are those of
+    `str.splitlines`. Strings and text streams are lexed in chunks of
+    CHUNK_SIZE, while any other iterable is taken to yield one line at a time,
+    with or without its line break.
+    '''
+
+    if isinstance(content, str):
+        chunks = (content[start:start + CHUNK_SIZE]
+                  for start in range(0, len(content), CHUNK_SIZE))
+        yield from _lex_chunks(chunks, lexer)
+    elif hasattr(content, 'read'):
+        chunks = iter(lambda: content.read(CHUNK_SIZE), '')
+        yield from _lex_chunks(chunks, lexer)
+    else:
+        for line in content:
+            yield from _lex_chunks((line,), lexer)
+
+            if not line or line[-1] not in LINE_BREAKS:
+                yield [(Kind.LINE_BREAK, '\n')]
+
+
+def _lex_chunks(chunks, lexer):
+    ''' Splits text chunks into tokens, joining the words split by chunking '''
+
+    pending = ''
+
+    for chunk in chunks:
+        chunk = pending + chunk
+        end = len(chunk)
+
+        # Hold back a word, or a CR of CRLF, that may go on in the next chunk
+        while end and not chunk[end - 1].isspace():
+            end -= 1
+        if end and chunk[end - 1] == '\r':
+            end -= 1
+
+        pending = chunk[end:]
+
+        if end:
+            yield _lex(lexer, chunk, end)
+
+    if pending:
+        yield _lex(lexer, pending, len(pending))
+
+
+def _lex(lexer, text, end):
+    return [(match.lastindex, match.group())
+            for match in lexer.finditer(text, 0, end)]
+
+
+def _partition_word(word: str, table) -> Iterable[str]:
+    ''' Splits words if word contains separator (shad) marks. '''
+
+    for match in table.LEXER.finditer(word):
+        yield match.group()
 
 
 def shad_before_nga(prev_word, partitioned_word, table):
     if not prev_word:
         return False
 
-    nga = table['CONSONANTS'][3]
+    nga = table.CONSONANTS[3]
     return prev_word[-len(partitioned_word):] == nga
 
 
@@ -103,67 +503,84 @@ def shad_before_ka_ga(prev_word, partitioned_word, table):
     if not prev_word:
         return False
 
-    ka_ga = (table['CONSONANTS'][0], table['CONSONANTS'][2])
+    ka_ga = (table.CONSONANTS[0], table.CONSONANTS[2])
     return prev_word[-2:-1] in ka_ga
 
 
-def cached_parser(table):
-    @lru_cache(maxsize=2500)
-    def cached_parse(word):
-        return parse(word, table)
+def _join_tokens(runs, table, analyze=cached_analyze_word):
+    '''
+    Joins runs of tokens (see `_read_tokens`) into Unicode output, parsing
+    the words with `analyze` as they come. The tokens of a line form
+    segments, which are joined with a space. The syllables of a segment are
+    joined with a tsheg (Tibetan syllable/word separator). A shad (Tibetan
+    sentence terminator) ends the current segment, and punctuation or a word
+    that could not be parsed is a segment of its own. E.g:
+
+    The line `sangs rgyas` is the single segment སངས་རྒྱས. The line
+    `| sangs rgyas |` is the two segments ། and སངས་རྒྱས་།, due to the shads.
+
+    Output is yielded as a list of strings per run, so no line is held in
+    memory. Blank lines are held back until a line with tokens follows them.
+    '''
 
-    return cached_parse
+    LINE_BREAK, SPACE, SHAD, _, WORD, SYLLABLE = Kind
+    blank_lines = 0
+    separators = LINE_START
+    prev_word = ''          # the token before, within whitespace
+    symbols = table.SYMBOL_LOOKUP
 
+    for run in runs:
+        output = []
+        write = output.append
 
-def _generate_tibetan_lines(content, table):
-    '''
-    The data structure used here is one list per content line. The elements of
-    each list hold a sequence of words that are to be joined with a tsheg
-    (Tibetan syllable/word separator). If a content line contains one ore more
-    shad's (Tibetan sentence terminator), or a word that could not be parsed,
-    the list representing this line, will contain multiple lists. E.g:
+        for kind, text in run:
+            if kind == WORD:
+                tib_unicode = analyze(text, table)[1]
 
-    The line `sangs rgyas` is represented as ['sangs', 'rgyas', []]. The line:
-    `| sangs rgyas |` is represented as [['|'], ['sangs', 'rgyas'], ['|'], []],
-    due to the shad (`|`).
-    '''
+                if tib_unicode is not None:
+                    kind = SYLLABLE
+                else:
+                    logger.debug(f'Could not parse: {text}')
+            elif kind == SPACE:
+                prev_word = ''
+                continue
+            elif kind == LINE_BREAK:
+                if separators is LINE_START:
+                    blank_lines += 1
+                else:
+                    write('\n')
 
-    fast_parse = cached_parser(table)
+                separators = LINE_START
+                prev_word = ''
+                continue
 
-    for line in content:
-        line_items = [[]]
-
-        for i, word in enumerate(line):
-            prev_word = ''
-            for j, partitioned_word in enumerate(_partition_word(word, table)):
-                if partitioned_word in table['LATIN_SHADS']:    # terminator
-                    # # if at start of a partitioned word, check previous line
-                    # prev_word = (partitioned_word[-1] if j > 0
-                    #              else line[max(i-1, 0)])
-                    unicode_shad = table['SYMBOL_LOOKUP'][partitioned_word]
-
-                    if shad_before_nga(prev_word, partitioned_word, table):
-                        # tsheg between nga and shad
-                        line_items.append([unicode_shad])
-                    elif shad_before_ka_ga(prev_word, partitioned_word, table):
-                        # normalize double shad to single when preceded by ka/ga
-                        line_items.append(U_SHADS[0])
-                    else:
-                        # Join with last word avoids space converted to tsheg
-                        line_items[-1].append(unicode_shad)
-
-                    line_items.append([])
-                    prev_word = partitioned_word
-                    continue
-
-                try:
-                    tib_unicode = fast_parse(partitioned_word)
-                    line_items[-1].append(tib_unicode)
-                except InvalidLanguage as e:
-                    logger.debug(f'Could not parse: {e.input}')
-                    line_items.append([e.input])
-                    line_items.append([])
-
-                prev_word = partitioned_word
-
-        yield line_items
+            if blank_lines:
+                write('\n' * blank_lines)
+                blank_lines = 0
+
+            if kind == SYLLABLE:
+                write(separators[kind] + tib_unicode)
+                separators = SEGMENT_OPEN
+                prev_word = text
+                continue
+
+            if kind == SHAD:    # terminator
+                if shad_before_nga(prev_word, text, table):
+                    # tsheg between nga and shad
+                    write(separators[WORD] + symbols[text])
+                elif shad_before_ka_ga(prev_word, text, table):
+                    # normalize double shad to single when preceded by ka/ga
+                    write(separators[WORD] + U_SHADS[0])
+                else:
+                    # Join with last word avoids space converted to tsheg
+                    write(separators[kind] + symbols[text])
+            else:
+                write(separators[kind] + text)
+
+            separators = SEGMENT_CLOSED
+            prev_word = text
+
+        yield output
+
+    if separators is not LINE_START:
+        yield ['\n']
@@ -0,0 +1,147 @@
+'''
+Conversion daemon of `ptib --serve`. It keeps its tables and the parse cache
+warm, listening on a Unix socket, or on a local TCP port, for connections
+that send requests as JSON lines (see `pytib.service`) and read the
+responses in the same order. `pytib.client` connects to it.
+'''
+
+import os
+import json
+import signal
+import asyncio
+import logging
+
+from concurrent.futures import ThreadPoolExecutor
+
+from pytib.client import connect, default_address, parse_address
+
+logger = logging.getLogger('pytib')
+
+# Longest request line, in bytes
+MAX_REQUEST_BYTES = 1 << 26
+# Connections served at the same time
+MAX_CONNECTIONS = 64
+# Seconds before an idle connection is closed
+IDLE_TIMEOUT = 300.0
+
+
+class Server:
+    ''' Answers connections with a Service, one request at a time '''
+
+    def __init__(self, service, address):
+        self.service = service
+        self.address = parse_address(address)
+        self.connections = 0
+        # Conversions are CPU bound and share the parse cache, so one thread
+        # runs them while the event loop moves bytes
+        self.executor = ThreadPoolExecutor(1)
+
+    async def serve(self, ready=None):
+        ''' Serves until SIGINT or SIGTERM, or until ready is cancelled '''
+
+        loop = asyncio.get_running_loop()
+        stop = loop.create_future()
+
+        if isinstance(self.address, tuple):
+            server = await asyncio.start_server(
+                self.connection, *self.address, limit=MAX_REQUEST_BYTES)
+        else:
+            remove_stale_socket(self.address)
+            server = await asyncio.start_unix_server(
+                self.connection, self.address, limit=MAX_REQUEST_BYTES)
+            # Only the user of the daemon may connect
+            os.chmod(self.address, 0o600)
+
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(signum, stop.cancel)
+            except (ValueError, RuntimeError):
+                # Not the main thread
+                pass
+
+        logger.info('Serving on %s', format_address(self.address))
+
+        try:
+            async with server:
+                if ready:
+                    ready(stop)
+                await asyncio.wait([stop])
+        finally:
+            self.executor.shutdown()
+
+            if not isinstance(self.address, tuple):
+                os.unlink(self.address)
+
+    async def connection(self, reader, writer):
+        self.connections += 1
+
+        try:
+            if self.connections > MAX_CONNECTIONS:
+                await self.reply(writer, error('Too many connections'))
+                return
+
+            await self.answer(reader, writer)
+        except (ConnectionError, asyncio.TimeoutError):
+            pass
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    async def answer(self, reader, writer):
+        loop = asyncio.get_running_loop()
+
+        while True:
+            try:
+                line = await asyncio.wait_for(reader.readline(), IDLE_TIMEOUT)
+            except ValueError:
+                # The rest of the line is still unread, so the connection
+                # can not go on
+                await self.reply(writer, error('Request too large'))
+                return
+
+            if not line:
+                return
+
+            if line.strip():
+                response = await loop.run_in_executor(
+                    self.executor, self.service.handle, line)
+                # Waiting for the client to read a response before the next
+                # request is read is the back-pressure
+                await self.reply(writer, response)
+
+    @staticmethod
+    async def reply(writer, response):
+        writer.write(response)
+        await writer.drain()
+
+
+def serve(service, address=None):
+    ''' Runs the daemon until it is interrupted '''
+
+    asyncio.run(Server(service, address or default_address()).serve())
+
+
+def remove_stale_socket(path):
+    ''' Removes the socket at path, unless a daemon is listening on it '''
+
+    if not os.path.exists(path):
+        return
+
+    client = connect(path)
+
+    if client:
+        client.close()
+        raise OSError(f'A daemon is already serving on {path}')
+
+    os.unlink(path)
+
+
+def format_address(address):
+    if isinstance(address, tuple):
+        return '%s:%d' % address
+
+    return address
+
+
+def error(message):
+    return json.dumps({'id': None, 'error': message}).encode('utf-8') + b'\n'
@@ -0,0 +1,195 @@
+'''
+Conversion requests of the long running modes of ptib (see `pytib.server`).
+A request is a JSON object with the text to convert,
+
+    {"id": 1, "text": "sangs rgyas"}
+
+or with a batch of texts, `"texts": ["sangs", "rgyas"]`, and an optional
+`"config"`, the path of a JSON config file. Without a config, an optional
+`"fingerprint"` names the tables the texts are converted with (see
+`tables.config_fingerprint`): the default tables for the default
+fingerprint, else those of the service, if they match. The response carries
+the id of the request and the `"result"`, as `read` outputs it, with the
+`"errors"` of the words that could not be parsed,
+
+    {"id": 1, "result": "...", "errors": [{"word": "bsgr",
+                                           "error": "InvalidTibetan"}]}
+
+or the lists of `"results"` and `"errors"` of a batch, or else an `"error"`
+if the request is invalid.
+
+Table snapshots are pickles, which can run code as they load, so a config
+named by a request is only ever read as JSON, and only from a regular file,
+as reading a FIFO or a device could block the daemon.
+'''
+
+import os
+import json
+import stat
+
+from functools import lru_cache
+
+from pytib.read import read_checked
+from pytib.tables import (generate_tables, add_syllables, is_snapshot,
+                          read_snapshot, DEFAULT_FINGERPRINT)
+from pytib.exceptions import InvalidConfig
+
+# Texts accepted in one request
+MAX_BATCH = 10000
+# Config files kept compiled
+CONFIG_CACHE_SIZE = 16
+
+
+class RequestError(ValueError):
+    pass
+
+
+def load_tables(file, syllables=None):
+    '''
+    Tables of an open binary config file, holding either a JSON config or a
+    snapshot written by `ptib compile-config`. Syllables are as for
+    `tables.generate_tables`. Only files the user chose should be loaded, as
+    snapshots are pickles.
+    '''
+
+    data = file.read()
+
+    if is_snapshot(data):
+        tables = read_snapshot(data, getattr(file, 'name', None))
+        return add_syllables(tables, syllables) if syllables else tables
+
+    return json_tables(data, syllables)
+
+
+def json_tables(data, syllables=None):
+    ''' Tables of the JSON config data, as bytes '''
+
+    try:
+        config = json.loads(data)
+    except ValueError:
+        raise InvalidConfig('Invalid JSON config file!', 'JSON decoding')
+
+    return generate_tables(config, syllables=syllables)
+
+
+def config_tables(path):
+    '''
+    Tables of the JSON config file at path, loaded again if it changes.
+    Raises InvalidConfig for a snapshot, which is never loaded from a path
+    given in a request, and for anything but a regular file.
+    '''
+
+    status = os.stat(path)
+
+    if not stat.S_ISREG(status.st_mode):
+        raise InvalidConfig('Not a regular file', path)
+
+    return _config_tables(os.path.abspath(path), status.st_mtime_ns,
+                          status.st_size)
+
+
+@lru_cache(CONFIG_CACHE_SIZE)
+def _config_tables(path, mtime_ns, size):
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    if is_snapshot(data):
+        raise InvalidConfig('Snapshots are only loaded with -c', path)
+
+    return json_tables(data)
+
+
+class Service:
+    '''
+    Answers requests, converting texts without a config with tables. The
+    parse cache is shared with the rest of the process, so it stays warm
+    from one request to the next.
+    '''
+
+    def __init__(self, tables=None):
+        self.tables = generate_tables() if tables is None else tables
+
+    def handle(self, line):
+        ''' Response line to a request line, both UTF-8 encoded JSON '''
+
+        request_id = None
+
+        try:
+            try:
+                request = json.loads(line)
+            except ValueError:
+                raise RequestError('Invalid JSON')
+
+            if not isinstance(request, dict):
+                raise RequestError('Request is not a JSON object')
+
+            request_id = request.get('id')
+            response = self.respond(request)
+        except RequestError as e:
+            response = {'error': str(e)}
+        except InvalidConfig as e:
+            response = {'error': f'Error in {e.config_item}! ({e.msg})'}
+        except OSError as e:
+            response = {'error': f'Can not read config: {e.strerror}'}
+
+        response = {'id': request_id, **response}
+        return json.dumps(response, ensure_ascii=False).encode('utf-8') + b'\n'
+
+    def respond(self, request):
+        ''' Response to a request, raising RequestError if it is invalid '''
+
+        config = request.get('config')
+        fingerprint = request.get('fingerprint')
+
+        if config is None:
+            tables = self.tables
+        elif isinstance(config, str):
+            tables = config_tables(config)
+        else:
+            raise RequestError('config is not a path')
+
+        if fingerprint is not None and fingerprint != tables.FINGERPRINT:
+            if config is not None or fingerprint != DEFAULT_FINGERPRINT:
+                raise RequestError('Tables do not match the fingerprint')
+
+            tables = generate_tables()
+
+        if 'texts' in request:
+            texts = request['texts']
+
+            if not isinstance(texts, list):
+                raise RequestError('texts is not a list')
+            if len(texts) > MAX_BATCH:
+                raise RequestError(f'More than {MAX_BATCH} texts')
+
+            converted = [self.convert(text, tables) for text in texts]
+            return {'results': [result for result, _ in converted],
+                    'errors': [errors for _, errors in converted]}
+
+        if 'text' in request:
+            result, errors = self.convert(request['text'], tables)
+            return {'result': result, 'errors': errors}
+
+        raise RequestError('No text to convert')
+
+    def convert(self, text, tables):
+        ''' Output of text and the errors of its words, as JSON values '''
+
+        if not isinstance(text, str):
+            raise RequestError('text is not a string')
+
+        result, errors = read_checked(text, tables)
+        return result, [{'word': e.input, 'error': type(e).__name__}
+                        for e in errors]
+
+
+def handle_lines(service, lines, out):
+    '''
+    Writes the response to each request line of lines to the binary stream
+    out, flushing it after each response
+    '''
+
+    for line in lines:
+        if line.strip():
+            out.write(service.handle(line))
+            out.flush()
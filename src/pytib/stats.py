@@ -0,0 +1,117 @@
+'''
+Optional instrumentation of the conversion hot path. Counting is off until
+`enable` is called, and costs one attribute check per word while off.
+'''
+
+from collections import Counter
+
+# Stages timed, in the order they are reported
+STAGES = (
+    'lookup',       # parse cache and disk cache lookups
+    'route',        # syllable table lookup and the Sanskrit quick check
+    'tibetan',      # syllable automaton: partition, analysis and Unicode
+    'partition',    # Sanskrit letter partition
+    'analysis',     # Sanskrit letter stacks
+    'unicode',      # Sanskrit Unicode
+    'joining',      # read outside of parsing: splitting, shads and tshegs
+)
+
+
+class Counters:
+    ''' Counts of one run, see `enable` '''
+
+    __slots__ = (
+        'words', 'analyzed', 'syllable_lookups', 'sanskrit_route',
+        'tibetan_fallbacks', 'sanskrit_misroutes', 'paths', 'word_lengths',
+        'stage_times',
+    )
+
+    def __init__(self):
+        self.words = 0                  # words looked up
+        self.analyzed = 0               # words missing from the caches
+        self.syllable_lookups = 0       # found in the syllable table
+        self.sanskrit_route = 0         # sent to Sanskrit by the quick check
+        # Misroutes of the quick check: words it let through that are then
+        # analyzed both ways, and words it sent to Sanskrit that are valid
+        # Tibetan syllables
+        self.tibetan_fallbacks = 0      # rejected as Tibetan, then Sanskrit
+        self.sanskrit_misroutes = 0     # sent to Sanskrit, but Tibetan
+        self.paths = Counter()
+        self.word_lengths = Counter()
+        self.stage_times = dict.fromkeys(STAGES, 0.0)
+
+    def merge(self, other):
+        ''' Adds the counts of other, e.g. of a worker process '''
+
+        self.words += other.words
+        self.analyzed += other.analyzed
+        self.syllable_lookups += other.syllable_lookups
+        self.sanskrit_route += other.sanskrit_route
+        self.tibetan_fallbacks += other.tibetan_fallbacks
+        self.sanskrit_misroutes += other.sanskrit_misroutes
+        self.paths.update(other.paths)
+        self.word_lengths.update(other.word_lengths)
+
+        for stage, seconds in other.stage_times.items():
+            self.stage_times[stage] += seconds
+
+
+# The counters of the current run, None while instrumentation is off
+counters = None
+
+
+def enable():
+    ''' Starts counting, from zero '''
+
+    global counters
+    counters = Counters()
+
+
+def disable():
+    ''' Stops counting, returning the counts of the run '''
+
+    global counters
+    result, counters = counters, None
+    return result
+
+
+def report(run):
+    ''' Human readable summary of the Counters of a run '''
+
+    hits = run.words - run.analyzed
+    lines = [
+        f'words:                 {run.words}',
+        f'cache hits:            {hits} ({_share(hits, run.words)})',
+        f'analyzed:              {run.analyzed}',
+        f'syllable table:        {run.syllable_lookups}',
+        f'Sanskrit quick check:  {run.sanskrit_route}',
+        f'Tibetan -> Sanskrit:   {run.tibetan_fallbacks}'
+        f' ({_share(run.tibetan_fallbacks, run.analyzed)} of analyzed)',
+        f'Sanskrit, but Tibetan: {run.sanskrit_misroutes}'
+        f' ({_share(run.sanskrit_misroutes, run.sanskrit_route)} of quick'
+        ' check)',
+    ]
+
+    for path, count in sorted(run.paths.items()):
+        lines.append(f'{path + ":":<23}{count}')
+
+    total = sum(run.stage_times.values())
+    lines.append('stage times:')
+
+    for stage in STAGES:
+        seconds = run.stage_times[stage]
+        lines.append(f'  {stage:<12}{seconds * 1e3:>10.1f} ms'
+                     f'  {_share(seconds, total):>6}')
+
+    lines.append('word lengths:')
+    longest = max(run.word_lengths.values(), default=0)
+
+    for length, count in sorted(run.word_lengths.items()):
+        bar = '#' * round(40 * count / longest)
+        lines.append(f'  {length:>4} {count:>9}  {bar}')
+
+    return '\n'.join(lines)
+
+
+def _share(part, whole):
+    return f'{part / whole:.1%}' if whole else '-'
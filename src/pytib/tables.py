@@ -1,7 +1,15 @@
 # -*- coding: utf-8 -*-
 import re
+import json
 import string
+import hashlib
+import itertools
+import threading
 
+from collections import OrderedDict
+from collections.abc import Mapping
+
+from pytib.version import __version__, ANALYSIS_VERSION
 from pytib.exceptions import InvalidConfig
 
 # Wylie/latin consonants
@@ -184,11 +192,281 @@ SHAD_IRREGULAR = (U_ROOTLETTERS[0], U_ROOTLETTERS[2])
 ACHUNG_INDEX = 22
 U_ACHUNG = U_ROOTLETTERS[22]
 
+# Rules of the Sanskrit detector prefix trie, see `compile_sanskrit_detector`
+PREFIX_SANSKRIT = 1     # starts with a clear case of Sanskrit
+PREFIX_DOUBLE = 2       # Sanskrit if three chars long, e.g. 'ggu'
+PREFIX_GA = 4           # starts with the ga prefix
+
+# Character classes of the Sanskrit detector
+CHAR_VOWEL = 1          # Tibetan vowel
+CHAR_DIPHTHONG = 2      # second char of 'ai' and 'au'
+CHAR_A_CHUNG = 4        # first char of the a-chung
+CHAR_NON_TIBETAN = 8    # not a letter of the Tibetan alphabet
+
+# Line breaks of `str.splitlines`
+LINE_BREAKS = '\n\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029'
+
+# Start of the header of a table snapshot, and the version of its format
+SNAPSHOT_MAGIC = 'pytib-tables'
+SNAPSHOT_FORMAT = 1
+
+# Start of the header of a syllable table file, and the version of its format
+SYLLABLES_MAGIC = '# pytib syllables'
+SYLLABLES_FORMAT = 2
+
 # TODO: find solution for the ww/wv ambiguity
 
 
-def generate_tables(config=None):
-    ''' Dynamically generate lookup tables '''
+class Tables(Mapping):
+    '''
+    Compiled, immutable lookup tables for one config.
+
+    Every field is an attribute named after its key in the former tables
+    dict, so `table.PREFIXES` and `table['PREFIXES']` are equivalent. The
+    mapping interface is kept as a compatibility view; the hot paths in
+    `pytib.core` use the attributes and the frozenset fields directly.
+    '''
+
+    __slots__ = (
+        # Canonical hash of the config the tables were compiled from
+        'FINGERPRINT',
+        # Alphabets and lookups, as originally exposed by the tables dict
+        'CONSONANTS',
+        'LATIN_VOWEL_A',
+        'LATIN_A_CHUNG',
+        'TIBETAN_VOWELS',
+        'LATIN_TIBETAN_ALPHABET',
+        'LATIN_TIBETAN_ALPHABET_SET',
+        'LATIN_INDIC_ALPHABET_SET',
+        'VALID_TIBETAN_LATIN_CHAR_SET',
+        'VALID_INDIC_LATIN_CHAR_SET',
+        'GA_PREFIX',
+        'PREFIXES',
+        'VALID_SUFFIX',
+        'TIBETAN_UNICODE',
+        'TIBINDIC_UNICODE',
+        'MAX_TIB_CHAR_LEN',
+        'MAX_INDIC_CHAR_LEN',
+        'S_BASIC_RULES',
+        'SW_VOWELS',
+        'W_VOWELS',
+        'SW_ROOTLETTERS',
+        'SW_SUBJOIN_RULES',
+        'SW_SUBJOIN',           # compiled on first use
+        'STACK',
+        'SNA_LDAN_CASES',
+        'S_DOUBLE_CONSONANTS',
+        'LATIN_SHADS',
+        'SYMBOL_LOOKUP',
+        'SPECIAL_CASE',
+        'PUNCTUATION_CHARS',
+        'LEXER',
+        'SUPERJOIN',
+        'VALID_SUPERJOIN',
+        'SUB',
+        'VALID_SUBJOINED_LIST',
+        # Compiled membership sets
+        'CONSONANT_SET',
+        'TIBETAN_VOWEL_SET',
+        'W_VOWEL_SET',
+        'SW_VOWEL_SET',
+        'PREFIX_SET',
+        'SUPERJOIN_SET',
+        'SUB_SET',
+        'SUPERJOIN_PAIRS',
+        'SUBJOIN_PAIRS',
+        'SUFFIX_SETS',
+        'S_DOUBLE_CONSONANT_SET',
+        'SNA_LDAN_SET',
+        'LATIN_SHAD_SET',
+        # Letter tries for the longest-match partitioning
+        'TIBETAN_TRIE',
+        'INDIC_TRIE',
+        # Sanskrit detector
+        'SANSKRIT_PREFIXES',
+        'SANSKRIT_CHAR_CLASSES',
+        # Tibetan syllable automaton
+        'VOWEL_UNICODE',
+        'ONSET_AUTOMATON',
+        'SUFFIX_AUTOMATON',
+        # Optional whole-syllable lookup, wylie -> unicode, or None
+        'SYLLABLES',
+    )
+
+    def __init__(self, **fields):
+        missing = set(self.__slots__) - set(fields) - _LAZY_FIELDS.keys()
+        if missing:
+            raise TypeError(f'Missing table fields: {sorted(missing)}')
+
+        for name, value in fields.items():
+            object.__setattr__(self, name, value)
+
+    def __getattr__(self, name):
+        # Only reached for the fields compiled on first use, while unset
+        try:
+            compile_field = _LAZY_FIELDS[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+        value = compile_field(self)
+        object.__setattr__(self, name, value)
+        return value
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Tables are immutable')
+
+    def __delattr__(self, name):
+        raise AttributeError('Tables are immutable')
+
+    def __reduce__(self):
+        return _restore_tables, (self._fields(),)
+
+    def _fields(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __iter__(self):
+        return iter(self.__slots__)
+
+    def __len__(self):
+        return len(self.__slots__)
+
+    # Tables are compared and hashed by identity, not by content
+    __eq__ = object.__eq__
+    __hash__ = object.__hash__
+
+
+def _restore_tables(fields):
+    return Tables(**fields)
+
+
+# Number of compiled tables kept by generate_tables
+TABLE_CACHE_SIZE = 16
+
+_table_cache = OrderedDict()
+_table_cache_lock = threading.Lock()
+
+
+def normalize_config(config):
+    ''' Config with defaults filled in and sequences as lists '''
+
+    config = {} if config is None else config
+
+    return {
+        'wylie_consonants': list(
+            config.get('wylie_consonants', W_ROOTLETTERS)
+        ),
+        'sanskrit_consonants': list(
+            config.get('sanskrit_consonants', SW_ROOTLETTERS)
+        ),
+        'sanskrit_vowels': list(config.get('sanskrit_vowels', SW_VOWELS)),
+        'ga_prefixer': config.get('ga_prefixer', '.'),
+        'shads': list(config.get('shads', W_SYMBOLS)),
+    }
+
+
+def config_fingerprint(config):
+    '''
+    Canonical hash of a config. Configs that compile to the same tables,
+    e.g. `None`, `{}` and the explicit defaults, share a fingerprint.
+    '''
+
+    canonical = json.dumps(
+        normalize_config(config),
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(',', ':')
+    )
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+DEFAULT_FINGERPRINT = config_fingerprint(None)
+
+
+def content_fingerprint(tables):
+    '''
+    Hash of everything tables compile to, except the syllable lookup, which
+    does not change any output. Unlike the config fingerprint, this changes
+    when a new version of the compiler builds different tables for a config.
+    '''
+
+    def serialize(value):
+        if isinstance(value, frozenset):
+            return sorted(value, key=repr)
+        if isinstance(value, re.Pattern):
+            return value.pattern
+        raise TypeError(f'Can not serialize {type(value).__name__}')
+
+    content = json.dumps(
+        {name: value for name, value in tables.items()
+         if name not in ('FINGERPRINT', 'SYLLABLES')},
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(',', ':'),
+        default=serialize
+    )
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def generate_tables(config=None, syllables=None):
+    '''
+    Returns the compiled lookup tables for config. Tables are memoized in a
+    process-wide registry keyed by the config fingerprint, so all callers
+    using the same config share one instance.
+
+    With `syllables=True` the tables include a lookup of every syllable of
+    the common shape (see `syllable_candidates`), built on first use. A
+    path loads that lookup from a file written by `write_syllables`.
+    '''
+
+    fingerprint = DEFAULT_FINGERPRINT if not config \
+        else config_fingerprint(config)
+    key = (fingerprint, str(syllables)) if syllables else fingerprint
+
+    with _table_cache_lock:
+        try:
+            tables = _table_cache[key]
+            _table_cache.move_to_end(key)
+            return tables
+        except KeyError:
+            pass
+
+    if syllables:
+        tables = add_syllables(generate_tables(config), syllables)
+    else:
+        tables = build_tables(config, fingerprint)
+
+    with _table_cache_lock:
+        _table_cache[key] = tables
+
+        if len(_table_cache) > TABLE_CACHE_SIZE:
+            _table_cache.popitem(last=False)
+
+    return tables
+
+
+def add_syllables(tables, syllables):
+    '''
+    Tables with a syllable lookup, built if syllables is True, else read from
+    the file at the path syllables
+    '''
+
+    if syllables is True:
+        from pytib.core import enumerate_syllables
+        lookup = dict(enumerate_syllables(tables))
+    else:
+        with open(syllables, encoding='utf-8') as f:
+            lookup = read_syllables(f, tables)
+
+    return Tables(**dict(tables._fields(), SYLLABLES=lookup))
+
+
+def build_tables(config=None, fingerprint=None):
+    ''' Dynamically generate lookup tables, bypassing the registry '''
 
     config = {} if config is None else config
     validate(config)
@@ -197,7 +475,7 @@ def generate_tables(config=None):
     sc = tuple(config.get('sanskrit_consonants', SW_ROOTLETTERS))
     sv = tuple(config.get('sanskrit_vowels', SW_VOWELS))
     ga_prefixer = config.get('ga_prefixer', '.')
-    latin_shads = config.get('shads', W_SYMBOLS)
+    latin_shads = tuple(config.get('shads', W_SYMBOLS))
     latin_vowel_a = tc[-1]
     latin_tibetan_alphabet = tc + W_VOWELS
     latin_indic_alphabet = (
@@ -247,60 +525,49 @@ def generate_tables(config=None):
         sc[17] + sc[18] + sv[0]         # 'ddhaṃ'
     )
 
-    re_vow = '|'.join(sv)
-    phyv = sc[21] + sc[25] + sc[28]
-    kri = sc[0] + sc[26] + sv[2]
-
-    SW_YATA_REGEX = (
-        # ya followed by one or two vowels and preceded by kṣ, t, ś, s, h
-        re.compile(f'({sc[33]}|{sc[15]}|{sc[29]}|{sc[31]}|{sc[32]})'
-                   f'{sc[25]}({re_vow}){{1,2}}$'),
-        re.compile(f'({sc[0]}|{sc[5]}){sc[25]}{sv[7]}'),  # (k|c)yai
-        re.compile(phyv),
-        # TODO: handle n.y
-        re.compile(  # (k|d|b|m|n)y
-            f'({sc[0]}|{sc[17]}|{sc[22]}|{sc[24]}|{sc[19]}){sc[25]}'
-        )
-    )
-
-    SW_RATA_REGEX = (
-        # ra followed by one or two vowels and preceded by t, th, bh, s
-        re.compile(
-            f'({sc[15]}|{sc[16]}|{sc[23]}|{sc[31]}){sc[26]}({re_vow}){{1,2}}$'),
-        re.compile(kri),
-        re.compile(  # (kh|k|d|b|m|g|n|p|ph|j)r
-            f'({sc[1]}|{sc[0]}|{sc[17]}|{sc[22]}|{sc[24]}|{sc[2]}|'
-            f'{sc[19]}|{sc[20]}|{sc[21]}|{sc[7]}){sc[26]}')
-    )
-
-    SW_WAZUR_REGEX = (
-        # va followed by one or two vowels and preceded by t, ḍ, d, dh, ś, s, tr
-        re.compile(f'({sc[15]}|{sc[12]}|{sc[17]}|{sc[18]}|{sc[29]}|{sc[31]}|'
-                   f'{sc[15]}{sc[26]}){sc[28]}({re_vow}){{1,2}}$'),
-        re.compile(phyv),
-        re.compile(f'({sc[25]}|{sc[7]}|{sc[27]}|{sc[32]}){sc[28]}')
-    )
-
-    SW_REGEX = {
-        sc[28]: SW_WAZUR_REGEX,
-        sc[25]: SW_YATA_REGEX,
-        sc[26]: SW_RATA_REGEX
+    # Subjoining rules for ya, ra and va, see `compile_subjoin_rules`. Each
+    # rule is the letters preceding the ya, ra or va, and the letters that
+    # may follow it, with None for any letter or none.
+    SW_SUBJOIN_RULES = {
+        sc[25]: (
+            # ya followed by a vowel and preceded by kṣ, t, ś, s, h
+            ((sc[33], sc[15], sc[29], sc[31], sc[32]), sv),
+            ((sc[0], sc[5]), (sv[7],)),     # (k|c)yai
+            ((sc[21],), (sc[28],)),         # phyv
+            # TODO: handle n.y
+            ((sc[0], sc[17], sc[22], sc[24], sc[19]), None),    # (k|d|b|m|n)y
+        ),
+        sc[26]: (
+            # ra followed by a vowel and preceded by t, th, bh, s
+            ((sc[15], sc[16], sc[23], sc[31]), sv),
+            ((sc[0],), (sv[2],)),           # kri
+            ((sc[1], sc[0], sc[17], sc[22], sc[24], sc[2],  # (kh|k|d|b|m|g|
+              sc[19], sc[20], sc[21], sc[7]), None),        # n|p|ph|j)r
+        ),
+        sc[28]: (
+            # va followed by a vowel and preceded by t, ḍ, d, dh, ś, s, tr
+            ((sc[15], sc[12], sc[17], sc[18], sc[29], sc[31],
+              sc[15] + sc[26]), sv),
+            ((sc[21] + sc[25],), None),     # phyv
+            ((sc[25], sc[7], sc[27], sc[32]), None),    # (y|j|l|h)v
+        ),
     }
 
     SW_OM = sv[8] + sv[14]
-    valid_tibetan_char_set = set(''.join(latin_tibetan_alphabet))
-    valid_indic_char_set = set(''.join(latin_indic_alphabet))
+    valid_tibetan_char_set = frozenset(''.join(latin_tibetan_alphabet))
+    valid_indic_char_set = frozenset(''.join(latin_indic_alphabet))
     all_valid_chars = valid_tibetan_char_set | valid_indic_char_set
     valid_punctuation_chars = set(string.punctuation) - all_valid_chars
 
     tables = {
+        'FINGERPRINT': fingerprint or config_fingerprint(config),
         'CONSONANTS': tc,
         'LATIN_VOWEL_A': latin_vowel_a,
         'LATIN_A_CHUNG': tc[ACHUNG_INDEX],
         'TIBETAN_VOWELS': W_VOWELS + (latin_vowel_a,),
         'LATIN_TIBETAN_ALPHABET': latin_tibetan_alphabet,
-        'LATIN_TIBETAN_ALPHABET_SET': set(latin_tibetan_alphabet),
-        'LATIN_INDIC_ALPHABET_SET': set(latin_indic_alphabet),
+        'LATIN_TIBETAN_ALPHABET_SET': frozenset(latin_tibetan_alphabet),
+        'LATIN_INDIC_ALPHABET_SET': frozenset(latin_indic_alphabet),
         'VALID_TIBETAN_LATIN_CHAR_SET': valid_tibetan_char_set,
         'VALID_INDIC_LATIN_CHAR_SET': valid_indic_char_set,
         'GA_PREFIX': ''.join([tc[2], ga_prefixer]),
@@ -319,7 +586,7 @@ def generate_tables(config=None):
         'SW_VOWELS': sv,
         'W_VOWELS': W_VOWELS,
         'SW_ROOTLETTERS': sc,
-        'SW_REGEX': SW_REGEX,
+        'SW_SUBJOIN_RULES': SW_SUBJOIN_RULES,
         'STACK': STACK,
         'SNA_LDAN_CASES': SNA_LDAN_CASES,
         'S_DOUBLE_CONSONANTS': S_DOUBLE_CONSONANTS,
@@ -330,9 +597,10 @@ def generate_tables(config=None):
             tc[16] + tc[29] + tc[11] + tc[10] + tc[29] + tc[11]: (    # tsandan
                 '\u0f59' + '\u0f53' + '\u0fa1' + '\u0f53')
         },
-        # Double shad checked before single shad
-        'PUNCTUATION_CHARS': (list(reversed(latin_shads))
-                              + [p for p in valid_punctuation_chars])
+        # Double shad checked before single shad, the remaining punctuation
+        # sorted to keep the partitioning of words independent of set order
+        'PUNCTUATION_CHARS': (tuple(reversed(latin_shads))
+                              + tuple(sorted(valid_punctuation_chars)))
     }
 
     tables['SUPERJOIN'], tables['VALID_SUPERJOIN'] = defs(
@@ -347,9 +615,535 @@ def generate_tables(config=None):
         tc
     )
 
+    tables.update(compile_membership(tables))
+    tables['TIBETAN_TRIE'] = build_trie(
+        latin_tibetan_alphabet + (tables['GA_PREFIX'],)
+    )
+    tables['INDIC_TRIE'] = build_trie(
+        latin_indic_alphabet + (tables['GA_PREFIX'],)
+    )
+    tables['VOWEL_UNICODE'] = {
+        vowel: tables['TIBETAN_UNICODE'][vowel] if vowel != latin_vowel_a
+        else ''
+        for vowel in tables['TIBETAN_VOWELS']
+    }
+    tables['LEXER'] = compile_lexer(tables)
+    tables['SANSKRIT_PREFIXES'], tables['SANSKRIT_CHAR_CLASSES'] = \
+        compile_sanskrit_detector(tables)
+    tables['SYLLABLES'] = None
+
+    return Tables(**tables)
+
+
+def compile_subjoin_rules(tables):
+    '''
+    Compiles SW_SUBJOIN_RULES into the set of the contexts where a Sanskrit
+    ya, ra or va is subjoined, rather than stacked in its full form. The
+    contexts are (preceding, letter, following): preceding is the letter
+    before, or for rules on two letters, the pair of letters before, and
+    following is the letter after, or None at the end of the stack.
+
+    A rule's preceding letters are matched against the end of the letters
+    before, so that e.g. the rule for `h` also holds after `kh`.
+    '''
+
+    consonants = tables['SW_ROOTLETTERS']
+    any_following = (None, tables['GA_PREFIX'],
+                     *tables['LATIN_INDIC_ALPHABET_SET'])
+    contexts = set()
+
+    for letter, rules in tables['SW_SUBJOIN_RULES'].items():
+        for preceding_letters, following in rules:
+            following = any_following if following is None else following
+
+            for preceding in preceding_letters:
+                for prev in consonants:
+                    if prev.endswith(preceding):
+                        before = (prev,)
+                    elif preceding.endswith(prev):
+                        head = preceding[:-len(prev)]
+                        before = tuple((prev2, prev) for prev2 in consonants
+                                       if prev2.endswith(head))
+                    else:
+                        continue
+
+                    contexts.update(
+                        (context, letter, after)
+                        for context in before for after in following
+                    )
+
+    return frozenset(contexts)
+
+
+def compile_lexer(tables):
+    '''
+    Compiles the tokenizer of `read` into a single regex, which splits text
+    into line breaks, runs of other whitespace, shads, other punctuation and
+    words, told apart by the group that matched.
+
+    Shads and punctuation are split off wherever they occur in a word. At
+    each position the shads are tried in the order of PUNCTUATION_CHARS, so
+    the double shad goes before the single shad.
+    '''
+
+    line_breaks = re.escape(LINE_BREAKS)
+    shad_set = tables['LATIN_SHAD_SET']
+    shad_alternatives = '|'.join(
+        re.escape(shad) for shad in dict.fromkeys(tables['PUNCTUATION_CHARS'])
+        if shad in shad_set
+    )
+    punctuation = ''.join(
+        char for char in tables['PUNCTUATION_CHARS'] if char not in shad_set
+    )
+    punctuation_chars = set(''.join(tables['PUNCTUATION_CHARS']))
+    shad_chars = ''.join(sorted(set(''.join(shad_set)) - punctuation_chars))
+    non_word_chars = ''.join(sorted(punctuation_chars)) + shad_chars
+
+    # Chars of a shad that are not punctuation stay in words, unless they
+    # start a shad
+    word_char = rf'[^\s{re.escape(non_word_chars)}]'
+
+    if shad_chars:
+        word_char = (rf'(?:{word_char}|(?!{shad_alternatives})'
+                     rf'[{re.escape(shad_chars)}])')
+
+    # Matches nothing if every punctuation char is part of the alphabet
+    punctuation = f'[{re.escape(punctuation)}]' if punctuation else '(?!)'
+
+    # The groups are numbered as the token kinds of `read.Kind`
+    return re.compile(
+        rf'(?P<line_break>\r\n|[{line_breaks}])'
+        rf'|(?P<space>[^\S{line_breaks}]+)'
+        rf'|(?P<shad>{shad_alternatives})'
+        rf'|(?P<punctuation>{punctuation})'
+        rf'|(?P<word>{word_char}+)'
+    )
+
+
+def compile_sanskrit_detector(tables):
+    '''
+    Compiles the heuristics telling clear cases of Sanskrit apart into a
+    prefix trie and a character class table, which `core.sanskrit_quick_check`
+    runs in a single scan of a word.
+
+    Each node of the trie maps a character to its child node, and the node
+    reached by a complete prefix stores its PREFIX_ rules under the '' key.
+    The class table maps a character to its CHAR_ classes; characters not in
+    it are CHAR_NON_TIBETAN.
+    '''
+
+    prefixes = {}
+
+    def add_prefix(prefix, rule):
+        node = prefixes
+
+        for char in prefix:
+            node = node.setdefault(char, {})
+
+        node[''] = node.get('', 0) | rule
+
+    for prefix in tables['S_BASIC_RULES']:
+        add_prefix(prefix, PREFIX_SANSKRIT)
+
+    # Matched on the first two chars of three char words only
+    for prefix in tables['S_DOUBLE_CONSONANTS']:
+        if len(prefix) == 2:
+            add_prefix(prefix, PREFIX_DOUBLE)
+
+    add_prefix(tables['GA_PREFIX'], PREFIX_GA)
+
+    classes = {}
+
+    for letter in tables['LATIN_TIBETAN_ALPHABET_SET']:
+        if len(letter) == 1:
+            classes[letter] = 0
+
+    for char in ('i', 'u'):
+        classes[char] = classes.get(char, CHAR_NON_TIBETAN) | CHAR_DIPHTHONG
+
+    for vowel in tables['TIBETAN_VOWEL_SET']:
+        if len(vowel) == 1:
+            classes[vowel] |= CHAR_VOWEL
+
+    a_chung = tables['LATIN_A_CHUNG'][0]
+    classes[a_chung] = classes.get(a_chung, CHAR_NON_TIBETAN) | CHAR_A_CHUNG
+
+    return prefixes, classes
+
+
+def compile_membership(tables):
+    ''' Frozensets for the membership tests on the parsing hot path '''
+
+    vowels = frozenset(tables['TIBETAN_VOWELS'])
+
+    return {
+        'CONSONANT_SET': frozenset(tables['CONSONANTS']),
+        'TIBETAN_VOWEL_SET': vowels,
+        'W_VOWEL_SET': frozenset(tables['W_VOWELS']),
+        'SW_VOWEL_SET': frozenset(tables['SW_VOWELS']),
+        'PREFIX_SET': frozenset(tables['PREFIXES']),
+        'SUPERJOIN_SET': frozenset(tables['SUPERJOIN']),
+        'SUB_SET': frozenset(tables['SUB']),
+        'SUPERJOIN_PAIRS': frozenset(
+            (head, root)
+            for head, roots in tables['VALID_SUPERJOIN'].items()
+            for root in roots
+        ),
+        'SUBJOIN_PAIRS': frozenset(
+            (root, subjoined)
+            for subjoined, roots in tables['VALID_SUBJOINED_LIST'].items()
+            for root in roots
+        ),
+        # Vowels are accepted in every suffix position
+        'SUFFIX_SETS': {
+            post_vowel: frozenset(suffixes) | vowels
+            for post_vowel, suffixes in tables['VALID_SUFFIX'].items()
+        },
+        'S_DOUBLE_CONSONANT_SET': frozenset(tables['S_DOUBLE_CONSONANTS']),
+        'SNA_LDAN_SET': frozenset(tables['SNA_LDAN_CASES']),
+        'LATIN_SHAD_SET': frozenset(tables['LATIN_SHADS']),
+    }
+
+
+def tibetan_onsets(tables):
+    '''
+    Syllable components of every valid sequence of letters before the first
+    vowel, following the rules of `core.vowel_pos_1` to `core.vowel_pos_4`,
+    generated from the prefix and stacking rules. Where the rules overlap,
+    the first that applies wins, as in the cascade.
+    '''
+
+    tc = tables['CONSONANTS']
+    ga_prefix = tables['GA_PREFIX']
+    letters = tuple(
+        letter for letter in tc + (ga_prefix,)
+        if letter not in tables['TIBETAN_VOWEL_SET']
+    )
+    roots = tuple(
+        letter for letter in letters if letter in tables['CONSONANT_SET']
+    )
+    superjoin, subjoin = tables['SUPERJOIN_PAIRS'], tables['SUBJOIN_PAIRS']
+
+    # Pairs that are either stacked under or over, the others take a prefix
+    stacks = dict.fromkeys(subjoin - superjoin, ('root', 'subjoined'))
+    stacks.update(dict.fromkeys(superjoin - subjoin, ('super', 'root')))
+
+    onsets = {(root,): ('root',) for root in roots}
+    onsets.update(stacks)
+
+    for prefix in (ga_prefix,) + tables['PREFIXES']:
+        for root in letters if prefix == ga_prefix else roots:
+            onsets.setdefault((prefix, root), ('prefix', 'root'))
+
+    for letter in letters:
+        onsets[letter, tc[24], tc[19]] = ('root', 'subjoined', 'secondsub')
+
+    for prefix in tables['PREFIXES']:
+        for stack, components in stacks.items():
+            onsets.setdefault((prefix,) + stack, ('prefix',) + components)
+
+    for head in tables['SUPERJOIN']:
+        for root in roots:
+            for subjoined in tables['SUB']:
+                onsets.setdefault((head, root, subjoined),
+                                  ('super', 'root', 'subjoined'))
+
+    for prefix in tables['PREFIXES']:
+        for head in tables['SUPERJOIN']:
+            for root in roots:
+                for subjoined in tables['SUB']:
+                    onsets[prefix, head, root, subjoined] = (
+                        'prefix', 'super', 'root', 'subjoined')
+
+    return onsets
+
+
+def compile_onset_automaton(tables):
+    '''
+    Compiles the Tibetan onset rules into a trie of every valid sequence of
+    letters before the first vowel. A node reached by a complete onset holds
+    the Unicode of the onset under the '' key, which the Unicode of the vowel
+    (see VOWEL_UNICODE) follows.
+    '''
+
+    tc = tables['CONSONANTS']
+    unicode = tables['TIBETAN_UNICODE']
+    ga_prefix = tables['GA_PREFIX']
+    onsets = tibetan_onsets(tables)
+
+    # The Unicode of each letter written on its own, and written below
+    # another, and which of the two each component of an onset takes
+    plain = {letter: unicode[letter] for letter in tc}
+    plain[ga_prefix] = unicode[tc[2]]
+    below = {letter: chr(SUBOFFSET + ord(char))
+             for letter, char in plain.items()}
+    forms = {
+        components: tuple(
+            below if component in ('subjoined', 'secondsub')
+            or component == 'root' and 'super' in components else plain
+            for component in components
+        )
+        for components in set(onsets.values())
+    }
+
+    # A vowel without an onset is written on a-chen
+    automaton = {'': unicode[tables['LATIN_VOWEL_A']]}
+
+    for onset, components in onsets.items():
+        node = automaton
+        chars = ''
+
+        for letter, form in zip(onset, forms[components]):
+            child = node.get(letter)
+
+            if child is None:
+                child = node[letter] = {}
+
+            node = child
+            chars += form[letter]
+
+        node[''] = chars
+
+    return automaton
+
+
+def compile_suffix_automaton(tables):
+    '''
+    Compiles the Tibetan suffix rules into one dict per post-vowel position
+    (see POSTVOWEL), mapping the letters allowed there to their Unicode.
+    '''
+
+    tc = tables['CONSONANTS']
+    unicode = tables['TIBETAN_UNICODE']
+    ga_prefix = tables['GA_PREFIX']
+    vowel_a = tables['LATIN_VOWEL_A']
+
+    post_vowels = {
+        letter: '' if letter == vowel_a
+        else unicode[tc[2] if letter == ga_prefix else letter]
+        for letter in tables['LATIN_TIBETAN_ALPHABET'] + (ga_prefix,)
+    }
+
+    return tuple(
+        {
+            letter: post_vowels[letter]
+            for letter in tables['SUFFIX_SETS'].get(post_vowel, post_vowels)
+        }
+        for post_vowel in POSTVOWEL
+    )
+
+
+# Fields compiled from the other fields when first used: the contexts of
+# the Sanskrit subjoined letters, which only Sanskrit words use, and the
+# Tibetan syllable automaton, which is the costliest field to build
+_LAZY_FIELDS = {
+    'SW_SUBJOIN': compile_subjoin_rules,
+    'ONSET_AUTOMATON': compile_onset_automaton,
+    'SUFFIX_AUTOMATON': compile_suffix_automaton,
+}
+
+
+def syllable_candidates(tables):
+    '''
+    Yields the wylie of every syllable of the common shape: an optional
+    prefix, a stack of valid super- and subscribed letters, a vowel, and
+    either a suffix with an optional second suffix, or an a-chung with a
+    vowel (the genitive and terminative particles).
+    '''
+
+    tc = tables['CONSONANTS']
+    roots = [
+        letter for letter in tc if letter not in tables['TIBETAN_VOWEL_SET']
+    ]
+    stacks = {(root,) for root in roots}
+    stacks.update(tables['SUBJOIN_PAIRS'])
+    stacks.update(
+        (root, tc[24], tc[19]) for root in roots
+        if (root, tc[24]) in tables['SUBJOIN_PAIRS']
+    )
+
+    for head, root in tables['SUPERJOIN_PAIRS']:
+        stacks.add((head, root))
+        stacks.update(
+            (head, root, subjoined)
+            for subjoined in tables['SUB']
+            if (root, subjoined) in tables['SUBJOIN_PAIRS']
+        )
+
+    onsets = {()} | stacks
+    onsets.update(
+        (prefix,) + stack
+        for prefix in tables['PREFIXES'] for stack in stacks
+        if stack[1:] != (tc[24], tc[19])
+    )
+    onsets.update((tables['GA_PREFIX'], root) for root in roots)
+
+    suffixes = tables['VALID_SUFFIX']['suffix']
+    endings = [''] + list(suffixes)
+    endings.extend(
+        suffix + suffix2
+        for suffix in suffixes
+        for suffix2 in tables['VALID_SUFFIX']['suffix2']
+    )
+    endings.extend(tc[ACHUNG_INDEX] + vowel for vowel in W_VOWELS)
+
+    for onset in onsets:
+        stem = ''.join(onset)
+
+        for vowel in tables['TIBETAN_VOWELS']:
+            for ending in endings:
+                yield stem + vowel + ending
+
+
+def write_syllables(f, tables):
+    '''
+    Writes the syllable lookup of tables as tab separated lines, after a
+    header line with the file format, the pytib and analysis versions, the
+    config fingerprint and the SHA-256 of the lines
+    '''
+
+    body = ''.join(f'{wylie}\t{unicode}\n'
+                   for wylie, unicode in tables.SYLLABLES.items())
+    digest = hashlib.sha256(body.encode('utf-8')).hexdigest()
+    f.write(f'{SYLLABLES_MAGIC} {SYLLABLES_FORMAT} {__version__} '
+            f'{ANALYSIS_VERSION} {tables.FINGERPRINT} {digest}\n')
+    f.write(body)
+
+
+def read_syllables(f, tables):
+    '''
+    Reads a syllable lookup written by `write_syllables` for tables. Raises
+    InvalidConfig if it was written by another pytib, for another config, or
+    changed since.
+    '''
+
+    name = getattr(f, 'name', None)
+    header = f.readline()
+
+    if not header.startswith(SYLLABLES_MAGIC):
+        raise InvalidConfig('Not a syllable table', name)
+
+    fields = header[len(SYLLABLES_MAGIC):].split()
+
+    if len(fields) != 5:
+        raise InvalidConfig(
+            'Syllable table was written by another pytib, build it again',
+            name
+        )
+
+    syllables_format, version, analysis, fingerprint, digest = fields
+
+    if (syllables_format != str(SYLLABLES_FORMAT) or version != __version__
+            or analysis != str(ANALYSIS_VERSION)):
+        raise InvalidConfig(
+            f'Syllable table was written by pytib {version}, build it again',
+            name
+        )
+
+    if fingerprint != tables.FINGERPRINT:
+        raise InvalidConfig('Syllable table was built for another config',
+                            name)
+
+    body = f.read()
+
+    if hashlib.sha256(body.encode('utf-8')).hexdigest() != digest:
+        raise InvalidConfig('Syllable table is corrupt', name)
+
+    # Each line ends with a newline, the last one included
+    return dict(line.split('\t', 1) for line in body.split('\n')[:-1])
+
+
+def write_snapshot(f, tables):
+    '''
+    Writes tables, with every field compiled, to the binary file f as a
+    snapshot that `read_snapshot` loads without compiling anything. The
+    header line holds the snapshot format, the pytib version and the SHA-256
+    of the pickled tables that follow it.
+    '''
+
+    import pickle
+
+    payload = pickle.dumps(tables, pickle.HIGHEST_PROTOCOL)
+    digest = hashlib.sha256(payload).hexdigest()
+    f.write(f'{SNAPSHOT_MAGIC} {SNAPSHOT_FORMAT} {__version__} {digest}\n'
+            .encode('ascii'))
+    f.write(payload)
+
+
+def is_snapshot(data):
+    ''' True if the bytes data start like a snapshot '''
+
+    return data.startswith(SNAPSHOT_MAGIC.encode('ascii'))
+
+
+def read_snapshot(data, name=None):
+    '''
+    Tables of a snapshot written by `write_snapshot`, given as bytes. Raises
+    InvalidConfig, naming the snapshot name, if it is of another format or
+    pytib version, or corrupt. Snapshots are pickles, so only trusted ones
+    should be loaded.
+    '''
+
+    header, _, payload = data.partition(b'\n')
+    fields = header.decode('ascii', 'replace').split()
+
+    if len(fields) != 4 or fields[0] != SNAPSHOT_MAGIC:
+        raise InvalidConfig('Not a table snapshot', name)
+
+    _, snapshot_format, version, digest = fields
+
+    if snapshot_format != str(SNAPSHOT_FORMAT) or version != __version__:
+        raise InvalidConfig(
+            f'Snapshot was written by pytib {version}, compile it again', name
+        )
+
+    if hashlib.sha256(payload).hexdigest() != digest:
+        raise InvalidConfig('Snapshot is corrupt', name)
+
+    # Only imported to load a snapshot, as most runs do not
+    import pickle
+
+    tables = pickle.loads(payload)
+
+    if not isinstance(tables, Tables):
+        raise InvalidConfig('Not a table snapshot', name)
+
     return tables
 
 
+def build_trie(letters):
+    '''
+    Compiles letters into a character trie. Each node maps a character to
+    its child node, and the node reached by a complete letter stores that
+    letter under the '' key.
+
+    Partitioning takes the longest matching letter, so multi-character
+    letters that can also be spelled with shorter letters (`tsh` vs. `ts` +
+    `h` vs. `t` + `sh`) always resolve to the longest one. This only works
+    in a single pass if every prefix of a letter is itself a letter; a
+    letter set that would require backtracking is rejected here.
+    '''
+
+    trie = {}
+
+    for letter in letters:
+        node = trie
+        for char in letter:
+            node = node.setdefault(char, {})
+        node[''] = letter
+
+    for letter in letters:
+        for i in range(1, len(letter)):
+            if letter[:i] not in letters:
+                raise InvalidConfig(
+                    f'Ambiguous letter {letter!r}: {letter[:i]!r} is not '
+                    'a letter',
+                    letter
+                )
+
+    return trie
+
+
 def validate(config):
     config_types = (
         ('wylie_consonants', W_ROOTLETTERS),
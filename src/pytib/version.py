@@ -0,0 +1,5 @@
+__version__ = '0.0.1'
+
+# Version of the analysis of words, to be raised by any change that changes
+# an output, as it outdates what was stored of earlier outputs
+ANALYSIS_VERSION = 1
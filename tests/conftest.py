@@ -1,8 +1,15 @@
 import pytest
 
+from pathlib import Path
+
 from pytib.tables import generate_tables
 
 
 @pytest.fixture
 def table():
     return generate_tables({})
+
+
+@pytest.fixture
+def resources():
+    return Path(__file__).parent.parent / 'resources'
@@ -1,4 +1,12 @@
-from pytib.core import generate_stacks
+import itertools
+
+import pytest
+
+from pytib.core import (generate_stacks, letter_partition, analyze_tibetan,
+                        recognize_tibetan, sanskrit_quick_check, ACCEPTED,
+                        REJECTED, NO_VOWEL)
+from pytib.tables import build_trie
+from pytib.exceptions import InvalidConfig, InvalidTibetan, ParseError
 
 
 def test_single_vowel_postitions(table):
@@ -18,3 +26,78 @@ def test_single_vowel_stack(table):
 def test_joined_vowel_postitions(table):
     assert list(generate_stacks(['g', 'a', 'i'], table)) \
         == [['g', 'a', 'i']]
+
+
+def test_longest_match_partition(table):
+    assert list(letter_partition('tshos', table.TIBETAN_TRIE)) \
+        == ['tsh', 'o', 's']
+    assert list(letter_partition('g.yag', table.TIBETAN_TRIE)) \
+        == ['g.', 'y', 'a', 'g']
+    assert list(letter_partition('dznya', table.TIBETAN_TRIE)) \
+        == ['dz', 'ny', 'a']
+    assert list(letter_partition('khau', table.INDIC_TRIE)) \
+        == ['kh', 'au']
+
+
+def test_invalid_partition(table):
+    with pytest.raises(ParseError):
+        list(letter_partition('', table.TIBETAN_TRIE))
+    with pytest.raises(ParseError):
+        list(letter_partition('kx', table.TIBETAN_TRIE))
+
+
+@pytest.mark.parametrize('string, sanskrit', (
+    ('sangs', False),
+    ('g.yag', False),
+    ("bka'", False),
+    ('', False),
+    ('dha', True),      # prefix rule
+    ('gga', True),      # double consonant
+    ('ggas', False),
+    ('bai', True),      # diphthong
+    ('badzra', True),   # two vowels
+    ("ba'i", False),
+    ('ṭa', True),       # not a Tibetan letter
+))
+def test_sanskrit_quick_check(table, string, sanskrit):
+    assert sanskrit_quick_check(string, table) is sanskrit
+
+
+def test_ambiguous_letters():
+    with pytest.raises(InvalidConfig):
+        build_trie(('k', 'tsh', 'ts'))
+
+
+def cascade(string, table):
+    try:
+        return ACCEPTED, analyze_tibetan(string, table)
+    except InvalidTibetan:
+        return NO_VOWEL, None
+    except ParseError:
+        return REJECTED, None
+
+
+def test_automaton_matches_cascade_on_syllables(table, resources):
+    with open(resources / 'tib_syllables', encoding='utf-8') as f:
+        syllables = f.read().split()
+
+    for syllable in syllables:
+        assert recognize_tibetan(syllable, table) == cascade(syllable, table)
+
+
+def test_automaton_matches_cascade_on_onsets(table):
+    letters = table.CONSONANTS[:-1] + (table.GA_PREFIX,)
+
+    for size in range(4):
+        for onset in itertools.product(letters, repeat=size):
+            for tail in ('a', "o'i", 'ongs'):
+                syllable = ''.join(onset) + tail
+                assert (recognize_tibetan(syllable, table)
+                        == cascade(syllable, table)), syllable
+
+
+def test_automaton_states(table):
+    assert recognize_tibetan('bsgrubs', table) == (ACCEPTED, 'བསྒྲུབས')
+    assert recognize_tibetan('bsgr', table) == (NO_VOWEL, None)
+    assert recognize_tibetan('ksgrub', table) == (REJECTED, None)
+    assert recognize_tibetan('dgx', table) == (REJECTED, None)
@@ -0,0 +1,67 @@
+import pytest
+
+from pytib import disk_cache as disk_cache_module
+from pytib.core import (parse, configure_parse_cache, use_disk_cache,
+                        TIBETAN, INVALID_TIBETAN)
+from pytib.tables import generate_tables
+from pytib.disk_cache import DiskCache
+
+
+@pytest.fixture
+def cache_path(tmp_path):
+    yield tmp_path / 'cache.sqlite'
+
+    use_disk_cache(None)
+    configure_parse_cache()
+
+
+def test_warm_start(table, cache_path):
+    with DiskCache(cache_path) as cache:
+        use_disk_cache(cache)
+        configure_parse_cache()
+        assert parse('sangs', table) == 'སངས'
+        assert (cache.hits, cache.misses) == (0, 1)
+
+    with DiskCache(cache_path) as cache:
+        use_disk_cache(cache)
+        configure_parse_cache()
+        assert parse('sangs', table) == 'སངས'
+        assert (cache.hits, cache.misses) == (1, 0)
+        assert cache.get(table, 'sangs') == (TIBETAN, 'སངས')
+
+
+def test_batches_and_limit(table, cache_path):
+    with DiskCache(cache_path, max_entries=3, batch_size=2) as cache:
+        cache.put(table, 'a', (TIBETAN, 'ཨ'))
+        assert cache.writes == 0
+        cache.put(table, 'bsgr', (INVALID_TIBETAN, None))
+        assert cache.writes == 2
+
+        for word in ('ka', 'kha', 'ga', 'nga'):
+            cache.put(table, word, (TIBETAN, parse(word, table)))
+
+    with DiskCache(cache_path) as cache:
+        assert cache.get(table, 'a') is None
+        assert cache.get(table, 'bsgr') is None
+        assert cache.get(table, 'nga') == (TIBETAN, 'ང')
+
+
+def test_invalidation(table, cache_path, monkeypatch):
+    other = generate_tables({'ga_prefixer': '-'})
+
+    with DiskCache(cache_path) as cache:
+        cache.put(table, 'sangs', (TIBETAN, 'སངས'))
+        cache.flush()
+        assert cache.get(other, 'sangs') is None
+
+    monkeypatch.setattr(disk_cache_module, '__version__', 'next')
+
+    with DiskCache(cache_path) as cache:
+        assert cache.get(table, 'sangs') is None
+        cache.put(table, 'sangs', (TIBETAN, 'སངས'))
+
+    # The analysis changed, the tables did not
+    monkeypatch.setattr(disk_cache_module, 'ANALYSIS_VERSION', 2)
+
+    with DiskCache(cache_path) as cache:
+        assert cache.get(table, 'sangs') is None
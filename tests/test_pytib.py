@@ -1,8 +1,14 @@
+import sys
+import subprocess
+
 import pytest
 
-from pytib.core import parse
+from pytib.core import (parse, parse_many, analyze_word, TIBETAN, SANSKRIT,
+                        INVALID_TIBETAN, INVALID_SANSKRIT, parse_cache_stats,
+                        configure_parse_cache, clear_parse_cache)
+from pytib.read import read
 from pytib.tables import generate_tables
-from pytib.exceptions import ParseError, InvalidSanskrit
+from pytib.exceptions import ParseError, InvalidSanskrit, InvalidTibetan
 
 
 @pytest.fixture
@@ -187,6 +193,17 @@ def test_akshye(table):
     assert parse(latin, table) == uni
 
 
+def test_repeated_subjoined(table):
+    # the second ya follows a ta, not the na of the first
+    uni = '\u0f53' + '\u0fbb' + '\u0f9f' + '\u0fb1'
+    latin = 'nytya'
+    assert parse(latin, table) == uni
+
+    uni = '\u0f62' + '\u0f7a' + '\u0f41' + '\u0fad' + '\u0fba'
+    latin = 'rekhvv'
+    assert parse(latin, table) == uni
+
+
 def test_ai(table):
     uni = '\u0F68' + '\u0F7B'
     latin = 'ai'
@@ -229,6 +246,69 @@ def test_bka(table):
     assert parse(latin, table) == uni
 
 
+def test_analyze_word_paths(table):
+    assert analyze_word('sangs', table) == (TIBETAN, 'སངས')
+    assert analyze_word('dha', table) == (SANSKRIT, '\u0F52')
+    assert analyze_word('badzra', table) == (INVALID_SANSKRIT, None)
+    assert analyze_word('bsgr', table) == (INVALID_TIBETAN, None)
+
+
+def test_parse_many(table):
+    words = ['sangs', 'rgyas', 'bsgr', 'sangs', 'badzra', 'dha', 'bsgr']
+    result = parse_many(iter(words), table)
+
+    assert result[:2] == ['སངས', 'རྒྱས']
+    assert result[3] == 'སངས' and result[5] == '\u0F52'
+    assert isinstance(result[2], InvalidTibetan) and result[2].input == 'bsgr'
+    assert result[6] is result[2]
+    assert isinstance(result[4], InvalidSanskrit)
+
+    assert parse_many(words, table, errors='ignore')[2] is None
+    with pytest.raises(InvalidTibetan):
+        parse_many(words, table, errors='raise')
+    with pytest.raises(ValueError):
+        parse_many(words, table, errors='skip')
+
+
+def test_parse_cache(table):
+    try:
+        configure_parse_cache(2)
+        parse('sangs', table)
+        parse('sangs', table)
+        parse('dha', table)
+        parse('rgyas', table)
+        with pytest.raises(InvalidTibetan):
+            parse('bsgr', table)
+
+        stats = parse_cache_stats()
+        assert (stats.hits, stats.misses, stats.evictions) == (1, 4, 2)
+        assert (stats.size, stats.maxsize) == (2, 2)
+        assert (stats.tibetan, stats.sanskrit) == (2, 1)
+        assert stats.invalid_tibetan == 1
+
+        ''.join(read('rgyas bsgr sangs', table))
+        assert parse_cache_stats().hits == 3
+
+        clear_parse_cache()
+        assert parse_cache_stats() == (0, 0, 0, 0, 2, 0, 0, 0, 0)
+    finally:
+        configure_parse_cache()
+
+
+def test_lazy_imports():
+    # The submodule read, once imported, does not replace the function
+    import pytib
+    import pytib.read
+    assert callable(pytib.read) and pytib.read is read
+    assert pytib.service.Service
+
+    code = ('import sys, pytib; '
+            'print(sorted(m for m in sys.modules if m.startswith("pytib")))')
+    result = subprocess.run([sys.executable, '-c', code], check=True,
+                            capture_output=True, text=True)
+    assert result.stdout.split() == ["['pytib',", "'pytib.version']"]
+
+
 # def test_mangalam(table):
 #     uni = '\u0f58' + '\u0f62' + '\u0f93' + '\u0f7e'
 #     latin = 'mangalaṃ'
@@ -1,8 +1,14 @@
+import io
+import importlib
+
 import pytest
 
-from pytib.read import read, _partition_word
+from pytib.read import (read, read_into, read_parallel, read_words,
+                        _partition_word, _join_tokens, Kind)
 from pytib.tables import generate_tables
 
+pytib_read = importlib.import_module('pytib.read')
+
 
 @pytest.fixture
 def table():
@@ -15,6 +21,48 @@ def test_classify_valid_word(table):
     assert tuple(_partition_word('/sangs', table)) == ('/', 'sangs')
     assert tuple(_partition_word('sangs/foo', table)) == ('sangs', '/', 'foo')
     assert tuple(_partition_word('sangs//foo', table)) == ('sangs', '//', 'foo')
+    assert tuple(_partition_word('a{b/c', table)) == ('a', '{', 'b', '/', 'c')
+
+
+def test_lexer(table):
+    tokens = [(match.lastgroup, match.group())
+              for match in table.LEXER.finditer('sangs///foo\t(a)\r\n')]
+
+    assert tokens == [
+        ('word', 'sangs'), ('shad', '//'), ('shad', '/'), ('word', 'foo'),
+        ('space', '\t'), ('punctuation', '('), ('word', 'a'),
+        ('punctuation', ')'), ('line_break', '\r\n'),
+    ]
+    assert [match.lastindex for match in table.LEXER.finditer('a/ (\n')] \
+        == [Kind.WORD, Kind.SHAD, Kind.SPACE, Kind.PUNCTUATION,
+            Kind.LINE_BREAK]
+
+
+def join(tokens, table):
+    ''' Joins tokens, parsing every word but x to its upper case '''
+
+    def analyze(word, table):
+        return None, None if word == 'x' else word.upper()
+
+    return ''.join(map(''.join, _join_tokens([tokens], table, analyze)))
+
+
+def test_join_tokens(table):
+    tokens = [
+        (Kind.WORD, 'dang'), (Kind.SHAD, '/'), (Kind.SPACE, ' '),
+        (Kind.WORD, 'ka'), (Kind.WORD, 'x'), (Kind.WORD, 'nga'),
+        (Kind.SHAD, '//'), (Kind.PUNCTUATION, '('), (Kind.WORD, 'ga'),
+        (Kind.SPACE, ' '), (Kind.WORD, 'ga'), (Kind.SHAD, '//'),
+    ]
+    assert join(tokens, table) == 'DANG་། KA x NGA ། ( GA་GA །\n'
+
+
+def test_join_blank_lines(table):
+    tokens = [
+        (Kind.LINE_BREAK, '\n'), (Kind.SPACE, ' '), (Kind.LINE_BREAK, '\n'),
+        (Kind.WORD, 'ka'), (Kind.LINE_BREAK, '\n'), (Kind.LINE_BREAK, '\n'),
+    ]
+    assert join(tokens, table) == '\n\nKA\n'
 
 
 def test_bka(table):
@@ -35,6 +83,10 @@ def test_unsplit_curly(table):
     assert ''.join(read('{sangs sangs}', table)).rstrip() == '{ སངས་སངས }'
 
 
+def test_split_punctuation(table):
+    assert ''.join(read('[(2a,1)]', table)).rstrip() == '[ ( 2a , 1 ) ]'
+
+
 def test_joined_shad_after_nga(table):
     assert ''.join(read('dang/', table)).rstrip() == 'དང་།'
 
@@ -95,5 +147,96 @@ def test_invalid_double_shad_for_ga(table):
     assert ''.join(read('ga//', table)).rstrip() == 'ག །'
 
 
+def test_read_stream(table, monkeypatch):
+    content = 'sangs rgyas/\r\n\n\nbka\' foo\n\n  \n'
+    expected = 'སངས་རྒྱས་།\n\n\nབཀའ foo\n'
+
+    assert ''.join(read(content, table)) == expected
+    assert ''.join(read(content.splitlines(), table)) == expected
+    assert ''.join(read(io.StringIO(content, newline=''), table)) == expected
+
+    monkeypatch.setattr(pytib_read, 'CHUNK_SIZE', 3)
+    assert ''.join(read(io.StringIO(content, newline=''), table)) == expected
+
+
+def test_read_long_line(table, monkeypatch):
+    monkeypatch.setattr(pytib_read, 'CHUNK_SIZE', 64)
+    output = read(io.StringIO('sangs ' * 100000), table)
+
+    assert next(output) == 'སངས'
+    assert next(output) == '་སངས'
+
+
+def test_read_parallel(table, resources, monkeypatch):
+    monkeypatch.setattr(pytib_read, 'MIN_CHUNK_CHARS', 16)
+
+    content = 'sangs rgyas/\n\n\n\n/ foo\n  \n\n bka\'\n\n\n'
+    assert ''.join(read_parallel(content, table, 2)) == ''.join(read(content))
+
+    with open(resources / 'refuge.wyl', encoding='utf-8') as f:
+        expected = ''.join(read(f, table))
+        f.seek(0)
+        assert ''.join(read_parallel(f, table, 3)) == expected
+
+
+def test_read_parallel_mapped(table, tmp_path, monkeypatch):
+    monkeypatch.setattr(pytib_read, 'MIN_CHUNK_CHARS', 16)
+    path = tmp_path / 'text.wyl'
+    content = 'oṃ sangs rgyas/\r\n\n\n/ foo\n  \n\n bka\'\rdha\n\n\nrgya'
+    path.write_bytes(content.encode('utf-8'))
+    expected = ''.join(read(content, table))
+
+    with open(path, encoding='utf-8') as f:
+        mapped = pytib_read._map_stream(f)
+        slices = list(pytib_read._file_slices(f, mapped, 16))
+        assert len(slices) > 1
+        assert all(content.encode('utf-8')[end - 1:end] == b'\n'
+                   for _, _, end, *_ in slices[:-1])
+        assert ''.join(read_parallel(f, table, 2)) == expected
+
+    with open(path, encoding='utf-8') as f:
+        f.readline()
+        assert pytib_read._map_stream(f) is None
+
+    path.write_text(content, encoding='utf-16')
+    with open(path, encoding='utf-16') as f:
+        assert pytib_read._map_stream(f) is None
+        assert ''.join(read_parallel(f, table, 2)) == expected
+
+
+def test_read_into(table, resources, monkeypatch):
+    class Writes(io.BytesIO):
+        writes = 0
+
+        def write(self, data):
+            self.writes += 1
+            return super().write(data)
+
+    with open(resources / 'refuge.wyl', encoding='utf-8') as f:
+        expected = ''.join(read(f, table))
+        f.seek(0)
+        out = Writes()
+        assert read_into(f, out, table) == len(expected)
+
+    assert out.getvalue().decode('utf-8') == expected
+    assert out.writes == 1
+
+    monkeypatch.setattr(pytib_read, 'WRITE_SIZE', 16)
+    monkeypatch.setattr(pytib_read, 'MIN_CHUNK_CHARS', 16)
+    out = Writes()
+    read_into('sangs rgyas\n' * 10, out, table, jobs=2)
+    assert out.getvalue().decode('utf-8') == 'སངས་རྒྱས\n' * 10
+    assert out.writes > 1
+
+
+def test_read_words(table):
+    assert list(read_words('ka bsgr/ dha\n', table)) == [
+        ('ka', 'tibetan', '\u0f40'),
+        ('bsgr', 'invalid tibetan', None),
+        ('dha', 'sanskrit', '\u0f52'),
+    ]
+    assert list(read_words('/ /\n', table)) == []
+
+
 # def test_no_double_shad_for_ga(table):
 #     assert ''.join(read('ga/', table)).rstrip() == 'ག'
@@ -0,0 +1,88 @@
+import os
+import json
+import asyncio
+import threading
+
+import pytest
+
+from pytib import client, server
+from pytib.read import read
+from pytib.service import Service
+
+
+@pytest.fixture
+def service(table):
+    return Service(table)
+
+
+@pytest.fixture
+def address(service, tmp_path):
+    address = str(tmp_path / 'pytib.sock')
+    started = threading.Event()
+    running = {}
+
+    def ready(stop):
+        running['loop'], running['stop'] = asyncio.get_running_loop(), stop
+        started.set()
+
+    thread = threading.Thread(target=asyncio.run, args=(
+        server.Server(service, address).serve(ready),))
+    thread.start()
+    started.wait(5)
+
+    yield address
+
+    running['loop'].call_soon_threadsafe(running['stop'].cancel)
+    thread.join(5)
+
+
+def test_round_trip(address, table):
+    with client.connect(address) as daemon:
+        assert daemon.convert('bkra shis') == ''.join(read('bkra shis', table))
+        assert daemon.convert('bde legs') == ''.join(read('bde legs', table))
+        assert daemon.request({'id': 'x', 'texts': ['ka']}) == {
+            'id': 'x', 'results': ['ཀ\n'], 'errors': [[]]}
+
+    assert client.connect(address + '.missing') is None
+
+
+def test_socket_of_another_user(address, monkeypatch):
+    status = os.stat(address)
+    assert status.st_mode & 0o777 == 0o600
+
+    monkeypatch.setattr(client.os, 'getuid', lambda: status.st_uid + 1)
+    assert client.connect(address) is None
+
+
+@pytest.fixture
+def small_requests(monkeypatch):
+    monkeypatch.setattr(server, 'MAX_REQUEST_BYTES', 1024)
+
+
+def test_request_too_large(small_requests, address):
+    with client.connect(address) as daemon:
+        daemon.file.write(b'x' * 2048 + b'\n')
+        daemon.file.flush()
+        assert json.loads(daemon.file.readline())['error'] == \
+            'Request too large'
+        assert daemon.file.readline() == b''
+
+
+def test_stale_socket(tmp_path):
+    path = tmp_path / 'stale.sock'
+    path.touch()
+    server.remove_stale_socket(str(path))
+    assert not path.exists()
+
+
+def test_parse_address():
+    assert client.parse_address(':7000') == ('127.0.0.1', 7000)
+    assert client.parse_address('localhost:7000') == ('localhost', 7000)
+    assert client.parse_address('/tmp/pytib.sock') == '/tmp/pytib.sock'
+    assert client.parse_address('[::1]:7000') == ('::1', 7000)
+
+    for address in ('0.0.0.0:7000', '192.168.1.2:7000', 'example.org:7000'):
+        with pytest.raises(ValueError):
+            client.parse_address(address)
+
+    assert client.connect('0.0.0.0:7000') is None
@@ -0,0 +1,126 @@
+import io
+import os
+import json
+
+import pytest
+
+from pytib.read import read, read_checked
+from pytib.service import Service, handle_lines, load_tables
+from pytib.tables import generate_tables, write_snapshot, DEFAULT_FINGERPRINT
+
+
+@pytest.fixture
+def service(table):
+    return Service(table)
+
+
+@pytest.fixture
+def polyglotta_table(resources):
+    path = resources.parent / 'configs' / 'polyglotta.json'
+
+    with open(path, encoding='utf-8') as f:
+        return generate_tables(json.load(f))
+
+
+def handle(service, request):
+    return json.loads(service.handle(json.dumps(request).encode('utf-8')))
+
+
+def test_handle(service, table, tmp_path):
+    assert handle(service, {'id': 1, 'text': 'sangs rgyas'}) == {
+        'id': 1, 'result': ''.join(read('sangs rgyas', table)), 'errors': []}
+    assert handle(service, {'id': 2, 'texts': ['ka', '', 'bsgr ka']}) == {
+        'id': 2, 'results': ['ཀ\n', '', 'bsgr ཀ\n'],
+        'errors': [[], [], [{'word': 'bsgr', 'error': 'InvalidTibetan'}]]}
+    assert handle(service, {'id': 3, 'text': 5})['error']
+    assert handle(service, [1])['error']
+    assert json.loads(service.handle(b'{'))['error'] == 'Invalid JSON'
+
+    config = tmp_path / 'config.json'
+    config.write_text('{"ga_prefixer": "-"}')
+    other = generate_tables({'ga_prefixer': '-'})
+    assert handle(service, {'id': 4, 'text': 'g-yag', 'config': str(config)}
+                  )['result'] == ''.join(read('g-yag', other))
+
+    config.write_text('{')
+    assert 'JSON decoding' in handle(
+        service, {'id': 5, 'text': 'g.yag', 'config': str(config)})['error']
+
+
+def test_snapshot_request(service, table, tmp_path):
+    snapshot = tmp_path / 'tables.bin'
+
+    with open(snapshot, 'wb') as f:
+        write_snapshot(f, table)
+
+    response = handle(service, {'text': 'ka', 'config': str(snapshot)})
+    assert 'only loaded with -c' in response['error']
+
+
+def test_irregular_config(service, tmp_path):
+    fifo = tmp_path / 'config.json'
+    os.mkfifo(fifo)
+
+    # Opening the FIFO would block until a writer opens it too
+    for path in (fifo, tmp_path):
+        response = handle(service, {'text': 'ka', 'config': str(path)})
+        assert 'Not a regular file' in response['error']
+
+
+def test_fingerprint(polyglotta_table, table):
+    service = Service(polyglotta_table)
+    text = 'ṅa tshangs / pa'
+
+    assert handle(service, {'text': text, 'fingerprint': DEFAULT_FINGERPRINT}
+                  )['result'] == ''.join(read(text, table))
+    assert handle(service, {
+        'text': text, 'fingerprint': polyglotta_table.FINGERPRINT}
+    )['result'] == ''.join(read(text, polyglotta_table))
+    assert handle(service, {'text': text, 'fingerprint': 'other'})['error']
+
+
+def test_load_tables(tmp_path):
+    config = tmp_path / 'config.json'
+    config.write_text('{"ga_prefixer": "-"}')
+    snapshot = tmp_path / 'tables.bin'
+
+    with open(config, 'rb') as f:
+        table = load_tables(f)
+
+    assert table is generate_tables({'ga_prefixer': '-'})
+
+    with open(snapshot, 'wb') as f:
+        write_snapshot(f, table)
+
+    with open(snapshot, 'rb') as f:
+        restored = load_tables(f, syllables=True)
+
+    assert restored.FINGERPRINT == table.FINGERPRINT
+    assert restored.SYLLABLES == generate_tables(
+        {'ga_prefixer': '-'}, syllables=True).SYLLABLES
+
+
+def test_read_checked(table):
+    text = 'bsgr sangs rgyas\nbsgr x'
+    result, errors = read_checked(text, table)
+    assert result == ''.join(read(text, table))
+    assert [(type(e).__name__, e.input) for e in errors] == [
+        ('InvalidTibetan', 'bsgr'), ('InvalidTibetan', 'bsgr'),
+        ('InvalidSanskrit', 'x')]
+
+
+class Flushes(io.BytesIO):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def flush(self):
+        self.records.append(self.getvalue())
+
+
+def test_handle_lines(service):
+    out = Flushes()
+    handle_lines(service, ['{"id": 1, "text": "ka"}\n', '\n', '[]\n'], out)
+    responses = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert [response['id'] for response in responses] == [1, None]
+    assert len(out.records) == 2
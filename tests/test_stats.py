@@ -0,0 +1,46 @@
+import pytest
+
+from pytib import stats
+from pytib.core import (analyze_word, _analyze_counted, configure_parse_cache,
+                        SANSKRIT, INVALID_TIBETAN)
+from pytib.read import read
+
+
+@pytest.fixture
+def counters():
+    configure_parse_cache()
+    stats.enable()
+    yield stats.counters
+    stats.disable()
+
+
+def test_counted_analysis(table, resources, counters):
+    with open(resources / 'tibsyll_sans.txt', encoding='utf-8') as f:
+        words = f.read().split()
+
+    for word in words:
+        assert _analyze_counted(word, table, counters) == analyze_word(word,
+                                                                       table)
+
+    assert counters.analyzed == len(words)
+    assert sum(counters.paths.values()) == len(words)
+    assert counters.tibetan_fallbacks > 0
+
+
+def test_read_counts(table, counters):
+    ''.join(read("sangs rgyas/ sangs bsgr dha badzra", table))
+
+    assert (counters.words, counters.analyzed) == (6, 5)
+    assert counters.word_lengths[5] == 3
+    assert counters.sanskrit_route == 2
+    assert counters.sanskrit_misroutes == 1     # dha
+    assert counters.paths[INVALID_TIBETAN] == 1
+    assert counters.paths[SANSKRIT] == 1
+    assert counters.stage_times['joining'] > 0
+    assert 'cache hits:            1 (16.7%)' in stats.report(counters)
+
+
+def test_disabled(table):
+    assert stats.counters is None
+    ''.join(read('sangs', table))
+    assert stats.disable() is None
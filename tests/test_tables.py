@@ -0,0 +1,157 @@
+import io
+import json
+import pickle
+import string
+
+from pathlib import Path
+
+import pytest
+
+from pytib import tables
+from pytib.core import analyze_word
+from pytib.tables import (Tables, TABLE_CACHE_SIZE, config_fingerprint,
+                          generate_tables, add_syllables, write_syllables,
+                          write_snapshot, read_snapshot)
+from pytib.exceptions import InvalidConfig
+
+
+@pytest.fixture
+def polyglotta_config():
+    with open(Path(__file__).parent.parent / 'configs' / 'polyglotta.json',
+              encoding='utf-8') as f:
+        return json.load(f)
+
+
+def test_dict_view(table):
+    assert table['PREFIXES'] is table.PREFIXES
+    assert table['CONSONANTS'][3] == 'ng'
+    assert 'GA_PREFIX' in table
+    assert table.get('NO_SUCH_TABLE') is None
+    with pytest.raises(KeyError):
+        table['NO_SUCH_TABLE']
+
+
+def test_immutable(table):
+    with pytest.raises(AttributeError):
+        table.GA_PREFIX = 'g-'
+    with pytest.raises(TypeError):
+        table['GA_PREFIX'] = 'g-'
+
+
+def test_membership_sets(table):
+    assert table.PREFIX_SET == frozenset(table.PREFIXES)
+    assert ('r', 'k') in table.SUPERJOIN_PAIRS
+    assert ('k', 'r') not in table.SUPERJOIN_PAIRS
+    assert ('k', 'y') in table.SUBJOIN_PAIRS
+    assert 'o' in table.SUFFIX_SETS['suffix']
+    assert 'ng' in table.SUFFIX_SETS['suffix']
+    assert 'ng' not in table.SUFFIX_SETS['suffix2']
+
+
+def test_pickle(table):
+    restored = pickle.loads(pickle.dumps(table))
+    assert isinstance(restored, Tables)
+    assert restored.SUBJOIN_PAIRS == table.SUBJOIN_PAIRS
+    assert restored.SW_SUBJOIN == table.SW_SUBJOIN
+
+
+def test_lazy_fields():
+    table = tables.build_tables()
+    with pytest.raises(AttributeError):
+        Tables.SW_SUBJOIN.__get__(table)
+
+    assert table.SW_SUBJOIN == tables.compile_subjoin_rules(table)
+    assert Tables.SW_SUBJOIN.__get__(table) is table.SW_SUBJOIN
+    with pytest.raises(AttributeError):
+        table.NO_SUCH_TABLE
+
+
+def test_shared_instance():
+    default = generate_tables()
+    assert generate_tables({}) is default
+    assert generate_tables({'ga_prefixer': '.'}) is default
+    assert generate_tables({'shads': ['/', '//']}) is default
+
+
+def test_config_fingerprint(polyglotta_config):
+    assert config_fingerprint(None) == config_fingerprint({})
+    assert config_fingerprint(polyglotta_config) != config_fingerprint({})
+    assert (generate_tables(polyglotta_config).FINGERPRINT
+            == config_fingerprint(polyglotta_config))
+
+
+def test_registry_bounded():
+    for i in range(TABLE_CACHE_SIZE + 1):
+        generate_tables({'ga_prefixer': string.ascii_uppercase[i]})
+
+    assert len(tables._table_cache) == TABLE_CACHE_SIZE
+
+
+def test_syllable_lookup(resources):
+    table = generate_tables({}, syllables=True)
+    assert generate_tables({}, syllables=True) is table
+    assert table.FINGERPRINT == generate_tables().FINGERPRINT
+    assert table.SYLLABLES['bsgrubs'] == 'བསྒྲུབས'
+    assert table.SYLLABLES["pa'i"] == 'པའི'
+
+    with open(resources / 'tib_syllables', encoding='utf-8') as f:
+        for syllable in f.read().split():
+            assert (analyze_word(syllable, table)
+                    == analyze_word(syllable, generate_tables()))
+
+
+def test_syllable_file(tmp_path):
+    path = tmp_path / 'syllables.tsv'
+    table = generate_tables({}, syllables=True)
+
+    with open(path, 'w', encoding='utf-8') as f:
+        write_syllables(f, table)
+
+    assert generate_tables({}, syllables=path).SYLLABLES == table.SYLLABLES
+
+    with pytest.raises(InvalidConfig):
+        generate_tables({'ga_prefixer': '-'}, syllables=path)
+
+    lines = path.read_text(encoding='utf-8').split('\n')
+    header = lines[0].split()
+
+    path.write_text('\n'.join([lines[0], 'sangs\tx', *lines[2:]]),
+                    encoding='utf-8')
+    with pytest.raises(InvalidConfig, match='corrupt'):
+        add_syllables(generate_tables({}), path)
+
+    header[4] = '0.0.0'
+    path.write_text('\n'.join([' '.join(header), *lines[1:]]),
+                    encoding='utf-8')
+    with pytest.raises(InvalidConfig, match='pytib 0.0.0'):
+        add_syllables(generate_tables({}), path)
+
+
+def test_snapshot(polyglotta_config):
+    table = generate_tables(polyglotta_config)
+    f = io.BytesIO()
+    write_snapshot(f, table)
+    snapshot = f.getvalue()
+
+    restored = read_snapshot(snapshot)
+    assert restored.FINGERPRINT == table.FINGERPRINT
+    assert restored.ONSET_AUTOMATON == table.ONSET_AUTOMATON
+    assert restored.SW_SUBJOIN == table.SW_SUBJOIN
+    assert restored.LEXER.pattern == table.LEXER.pattern
+    assert analyze_word('daṅ', restored) == analyze_word('daṅ', table)
+
+    header, payload = snapshot.split(b'\n', 1)
+    corrupt = bytearray(snapshot)
+    corrupt[len(snapshot) // 2] ^= 1
+    with pytest.raises(InvalidConfig, match='corrupt'):
+        read_snapshot(bytes(corrupt))
+    with pytest.raises(InvalidConfig, match='pytib 0.0.0'):
+        read_snapshot(header.replace(b' 0.0.1 ', b' 0.0.0 ') + b'\n' + payload)
+    with pytest.raises(InvalidConfig, match='Not a table snapshot'):
+        read_snapshot(b'{}')
+
+
+def test_polyglotta_syllables(polyglotta_config):
+    table = generate_tables(polyglotta_config, syllables=True)
+    assert table.SYLLABLES['daṅ'] == 'དང'
+    assert 'dang' not in table.SYLLABLES